@@ -19,6 +19,7 @@
 
 import utils
 import cache
+import sessions
 from common import kodi, log_utils
 from error_handling import api_error_handler
 from constants import Keys, SCOPES
@@ -30,6 +31,7 @@ from twitch_exceptions import TwitchException
 from twitch.api.parameters import Boolean, Period, ClipPeriod, Direction, Language, SortBy, StreamType, VideoSort
 
 i18n = utils.i18n
+sessions.install()
 
 
 class Twitch:
@@ -113,7 +115,7 @@ class Twitch:
         return self.error_check(results)
 
     @api_error_handler
-    @cache.cache_method(cache_limit=cache.limit)
+    @cache.cache_method(fresh_for=cache.limit, stale_for=cache.stale_limit)
     def get_top_games(self, offset, limit):
         results = self.api.games.get_top(offset=offset, limit=limit)
         return self.error_check(results)
@@ -131,7 +133,7 @@ class Twitch:
         return self.error_check(results)
 
     @api_error_handler
-    @cache.cache_method(cache_limit=cache.limit)
+    @cache.cache_method(fresh_for=cache.limit, stale_for=cache.stale_limit)
     def get_all_streams(self, stream_type, platform, offset, limit, language=Language.ALL):
         results = self.api.streams.get_all(stream_type=stream_type, platform=platform, offset=offset, limit=limit, language=language)
         return self.error_check(results)
@@ -287,7 +289,7 @@ class Twitch:
         return self.error_check(results)
 
     @api_error_handler
-    @cache.cache_method(cache_limit=cache.limit)
+    @cache.cache_method(cache_limit=cache.limit, tag='channel_id')
     def get_channel_stream(self, channel_id):
         results = self.api.streams.by_id(channel_id=channel_id, stream_type=StreamType.ALL)
         return self.error_check(results)
@@ -309,7 +311,7 @@ class Twitch:
         return self.error_check(results)
 
     @api_error_handler
-    @cache.cache_method(cache_limit=cache.limit)
+    @cache.cache_method(fresh_for=cache.limit, stale_for=cache.stale_limit)
     def get_followed_streams(self, stream_type, offset, limit):
         results = self.api.streams.get_followed(stream_type=stream_type, limit=limit, offset=offset)
         return self.error_check(results)
@@ -326,7 +328,7 @@ class Twitch:
         return self.usher.clip(slug)
 
     @api_error_handler
-    @cache.cache_method(cache_limit=cache.limit)
+    @cache.cache_method(cache_limit=cache.limit, tag='name')
     def get_live(self, name):
         results = self.usher.live(name)
         return self.error_check(results)
@@ -21,5 +21,13 @@ from common import cache, kodi
 cache_function = cache.cache_function
 cache_method = cache.cache_method
 reset_cache = cache.reset_cache
+invalidate = cache.invalidate
+purge_expired = cache.purge_expired
+revalidate = cache.revalidate
+has_pending_refresh = cache.has_pending_refresh
+get_stats = cache.get_stats
+log_stats = cache.log_stats
+trim = cache.trim
 limit = float(kodi.get_setting('cache_expire_time')) / 60
+stale_limit = 0.5  # hours a stale listing is served while the service refreshes it
 cache.cache_enabled = limit > 0
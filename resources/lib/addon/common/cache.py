@@ -18,12 +18,16 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 import functools
+import inspect
+import json
 import log_utils
 import time
 import cPickle as pickle
 import hashlib
 import os
-import shutil
+import sqlite3
+import threading
+from collections import OrderedDict
 import kodi
 
 cache_path = kodi.translate_path('special://temp/%s/cache/' % kodi.get_id())
@@ -35,6 +39,294 @@ except Exception as e:
 
 cache_enabled = kodi.get_setting('use_cache') == 'true'
 
+DB_NAME = 'cache.db'
+SCHEMA_VERSION = 6
+MEMORY_LIMIT = 8 * 1024 * 1024  # bytes of pickled results held in memory
+LOCK_TIMEOUT = 30  # seconds before a fetch lock is considered abandoned
+LOCK_WAIT = 10  # seconds to wait for another process to store a result
+LOCK_POLL = 0.1
+ACCESS_RESOLUTION = 60  # seconds, last access is only rewritten when older than this
+KEY_VERSION = 1  # bump when the key format or the shape of cached results changes
+
+_refreshers = {}  # '<module>.<function>' -> (function, is_method, fresh_for, stale_for, key_builder)
+
+
+class CacheStats(object):
+    """
+    per method counters, times are in seconds
+    """
+    FIELDS = ('hits', 'misses', 'bytes_read', 'bytes_written', 'serialize_time', 'deserialize_time')
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, **values):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = dict.fromkeys(self.FIELDS, 0)
+            for field, value in values.iteritems():
+                stats[field] += value
+
+    def get(self):
+        with self._lock:
+            return dict((name, dict(stats)) for name, stats in self._stats.iteritems())
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class MemoryCache(object):
+    """
+    size bounded LRU of pickled results kept in front of the disk store
+
+    entries are stored pickled so callers always get their own copy of a result
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now=None):
+        if now is None: now = time.time()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, fresh_until, expires = entry
+            if expires <= now:
+                self.total_bytes -= size
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+            return entry
+
+    def set(self, key, value, fresh_until, expires):
+        size = len(value)
+        with self._lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, fresh_until, expires)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _key, _entry = self._entries.popitem(last=False)
+                self.total_bytes -= _entry[1]
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+class SQLiteCache(object):
+    """
+    single file cache store, one row per cached result
+
+    connections are per thread, the database is opened in WAL mode so readers
+    in other plugin invocations or the service are not blocked by writers
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=10)
+            connection.text_factory = str
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._create_schema(connection)
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _create_schema(connection):
+        if connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION:
+            return
+        # take the write lock before checking again, other processes may be migrating at the same time
+        connection.isolation_level = None
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                    connection.execute('DROP TABLE IF EXISTS cache')
+                    connection.execute('DROP TABLE IF EXISTS refresh')
+                    connection.execute('DROP TABLE IF EXISTS locks')
+                    connection.execute('CREATE TABLE cache (key TEXT PRIMARY KEY, name TEXT NOT NULL, tag TEXT, fresh_until REAL NOT NULL, '
+                                       'expires REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL, value BLOB NOT NULL)')
+                    connection.execute('CREATE INDEX cache_expires ON cache (expires)')
+                    connection.execute('CREATE INDEX cache_accessed ON cache (accessed)')
+                    connection.execute('CREATE INDEX cache_name ON cache (name)')
+                    connection.execute('CREATE INDEX cache_tag ON cache (tag)')
+                    connection.execute('CREATE TABLE refresh (key TEXT PRIMARY KEY, refresher TEXT NOT NULL, name TEXT NOT NULL, '
+                                       'args BLOB NOT NULL, requested REAL NOT NULL)')
+                    connection.execute('CREATE TABLE locks (key TEXT PRIMARY KEY, acquired REAL NOT NULL)')
+                    connection.execute('PRAGMA user_version=%d' % SCHEMA_VERSION)
+                connection.execute('COMMIT')
+            except:
+                connection.execute('ROLLBACK')
+                raise
+            if connection.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                # incremental, evict() returns the pages of removed entries to the file system
+                connection.execute('PRAGMA auto_vacuum=INCREMENTAL')
+                connection.execute('VACUUM')
+        finally:
+            connection.isolation_level = ''
+
+    def get(self, key, now=None):
+        if now is None: now = time.time()
+        connection = self._connect()
+        row = connection.execute('SELECT value, size, fresh_until, expires, accessed FROM cache WHERE key = ? AND expires > ?', (key, now)).fetchone()
+        if row is None:
+            return None
+        if row[4] <= now - ACCESS_RESOLUTION:
+            with connection:
+                connection.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return str(row[0]), row[1], row[2], row[3]
+
+    def set(self, key, value, fresh_until, expires, name='', tag=None):
+        connection = self._connect()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO cache (key, name, tag, fresh_until, expires, accessed, size, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               (key, name, tag, fresh_until, expires, time.time(), len(value), sqlite3.Binary(value)))
+
+    def invalidate(self, name=None, prefix=None, tag=None):
+        """
+        remove entries matching all given criteria, returns the removed keys
+
+        name: cached method name, either 'get_live' or 'Twitch.get_live'
+        prefix: start of an entry tag, ie. 'get_live:' for all tagged get_live entries
+        tag: exact entry tag, ie. 'get_live:channel_name'
+        """
+        clauses = []
+        params = []
+        if name is not None:
+            clauses.append("(name = ? OR name LIKE ? ESCAPE '\\')")
+            params.extend([name, '%%.%s' % self._escape_like(name)])
+        if prefix is not None:
+            clauses.append("tag LIKE ? ESCAPE '\\'")
+            params.append('%s%%' % self._escape_like(prefix))
+        if tag is not None:
+            clauses.append('tag = ?')
+            params.append(tag)
+        if not clauses:
+            return []
+        where = ' AND '.join(clauses)
+        connection = self._connect()
+        with connection:
+            keys = [row[0] for row in connection.execute('SELECT key FROM cache WHERE %s' % where, params)]
+            connection.execute('DELETE FROM cache WHERE %s' % where, params)
+            connection.executemany('DELETE FROM refresh WHERE key = ?', [(key,) for key in keys])
+        return keys
+
+    @staticmethod
+    def _escape_like(value):
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    def purge_expired(self, now=None):
+        if now is None: now = time.time()
+        connection = self._connect()
+        with connection:
+            return connection.execute('DELETE FROM cache WHERE expires <= ?', (now,)).rowcount
+
+    def total_size(self):
+        return self._connect().execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+
+    def evict(self, max_bytes, now=None):
+        """
+        remove expired entries, then least recently used entries until the stored results fit in max_bytes
+
+        returns (entries, bytes) removed
+        """
+        if now is None: now = time.time()
+        connection = self._connect()
+        with connection:
+            expired_entries, expired_bytes = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE expires <= ?', (now,)).fetchone()
+            connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+            excess = connection.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0] - max_bytes
+            evicted = []
+            evicted_bytes = 0
+            if excess > 0:
+                for key, size in connection.execute('SELECT key, size FROM cache ORDER BY accessed'):
+                    evicted.append((key,))
+                    evicted_bytes += size
+                    if evicted_bytes >= excess:
+                        break
+                connection.executemany('DELETE FROM cache WHERE key = ?', evicted)
+        if expired_entries or evicted:
+            # hand the freed pages back to the file system, then truncate the write-ahead log
+            connection.execute('PRAGMA incremental_vacuum').fetchall()
+            connection.commit()
+            connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return expired_entries + len(evicted), expired_bytes + evicted_bytes
+
+    def clear(self):
+        connection = self._connect()
+        with connection:
+            connection.execute('DELETE FROM cache')
+            connection.execute('DELETE FROM refresh')
+            connection.execute('DELETE FROM locks')
+
+    def acquire(self, key, now=None):
+        if now is None: now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.execute('DELETE FROM locks WHERE key = ? AND acquired <= ?', (key, now - LOCK_TIMEOUT))
+            return connection.execute('INSERT OR IGNORE INTO locks (key, acquired) VALUES (?, ?)', (key, now)).rowcount == 1
+
+    def is_locked(self, key, now=None):
+        if now is None: now = time.time()
+        return self._connect().execute('SELECT 1 FROM locks WHERE key = ? AND acquired > ?', (key, now - LOCK_TIMEOUT)).fetchone() is not None
+
+    def release(self, key):
+        connection = self._connect()
+        with connection:
+            connection.execute('DELETE FROM locks WHERE key = ?', (key,))
+
+    def request_refresh(self, key, refresher, name, args):
+        connection = self._connect()
+        with connection:
+            connection.execute('INSERT OR IGNORE INTO refresh (key, refresher, name, args, requested) VALUES (?, ?, ?, ?, ?)',
+                               (key, refresher, name, sqlite3.Binary(args), time.time()))
+
+    def has_pending_refresh(self):
+        return self._connect().execute('SELECT 1 FROM refresh LIMIT 1').fetchone() is not None
+
+    def pending_refreshes(self, limit):
+        rows = self._connect().execute('SELECT key, refresher, name, args FROM refresh ORDER BY requested LIMIT ?', (limit,)).fetchall()
+        return [(key, refresher, name, str(args)) for key, refresher, name, args in rows]
+
+    def remove_refresh(self, key):
+        connection = self._connect()
+        with connection:
+            connection.execute('DELETE FROM refresh WHERE key = ?', (key,))
+
+
+_stats = CacheStats()
+_memory = MemoryCache(MEMORY_LIMIT)
+_cache = SQLiteCache(os.path.join(cache_path, DB_NAME))
+
 
 def make_cache_path():
     try:
@@ -44,73 +336,330 @@ def make_cache_path():
         log_utils.log('Failed to create cache: %s: %s' % (cache_path, e), log_utils.LOGWARNING)
 
 
+def _remove_legacy_files():
+    # results were previously stored as one pickle file per entry
+    for filename in os.listdir(cache_path):
+        if not filename.startswith(DB_NAME):
+            os.remove(os.path.join(cache_path, filename))
+
+
 def reset_cache():
     try:
-        shutil.rmtree(cache_path)
         make_cache_path()
+        _memory.clear()
+        _cache.clear()
+        _remove_legacy_files()
         return True
     except Exception as e:
         log_utils.log('Failed to Reset Cache: %s' % (e), log_utils.LOGWARNING)
         return False
 
 
-def _get_func(name, args=None, kwargs=None, cache_limit=1):
-    if not cache_enabled or cache_limit <= 0: return False, None
-    now = time.time()
-    max_age = now - (cache_limit * 60 * 60)
-    if args is None: args = []
-    if kwargs is None: kwargs = {}
-    full_path = os.path.join(cache_path, _get_filename(name, args, kwargs))
-    if os.path.exists(full_path):
-        mtime = os.path.getmtime(full_path)
-        if mtime >= max_age:
-            with open(full_path, 'r') as f:
-                pickled_result = f.read()
-            # log_utils.log('Returning cached result: |%s|%s|%s| - modtime: %s max_age: %s age: %ss' % (name, args, kwargs, mtime, max_age, now - mtime), log_utils.LOGDEBUG)
-            return True, pickle.loads(pickled_result)
+def invalidate(name=None, prefix=None, tag=None):
+    """
+    drop matching cached results instead of resetting the whole cache, see SQLiteCache.invalidate
 
-    return False, None
+    returns the number of removed results
+    """
+    try:
+        keys = _cache.invalidate(name=name, prefix=prefix, tag=tag)
+    except Exception as e:
+        log_utils.log('Failed to invalidate cache entries: %s' % (e), log_utils.LOGWARNING)
+        return 0
+    _memory.discard(keys)
+    log_utils.log('Invalidated |%d| cache entries: name |%s| prefix |%s| tag |%s|' % (len(keys), name, prefix, tag), log_utils.LOGDEBUG)
+    return len(keys)
 
 
-def _save_func(name, args=None, kwargs=None, result=None):
+def purge_expired():
     try:
-        if args is None: args = []
-        if kwargs is None: kwargs = {}
-        pickled_result = pickle.dumps(result)
-        full_path = os.path.join(cache_path, _get_filename(name, args, kwargs))
-        with open(full_path, 'w') as f:
-            f.write(pickled_result)
+        make_cache_path()
+        _remove_legacy_files()
+        return _cache.purge_expired()
+    except Exception as e:
+        log_utils.log('Failed to purge expired cache entries: %s' % (e), log_utils.LOGWARNING)
+        return 0
+
+
+def trim(max_bytes):
+    """
+    janitor run by the service, keeps the disk store within max_bytes of pickled results
+
+    returns bytes reclaimed
+    """
+    try:
+        entries, reclaimed = _cache.evict(max_bytes)
+    except Exception as e:
+        log_utils.log('Failed to trim cache: %s' % (e), log_utils.LOGWARNING)
+        return 0
+    if entries:
+        log_utils.log('Cache trimmed: |%d| entries |%d| bytes reclaimed' % (entries, reclaimed), log_utils.LOGDEBUG)
+    return reclaimed
+
+
+def get_stats():
+    """
+    returns {name: {hits, misses, bytes_read, bytes_written, serialize_time, deserialize_time}}
+    along with the memory tier totals under 'memory'
+    """
+    return {'methods': _stats.get(),
+            'memory': {'hits': _memory.hits, 'misses': _memory.misses, 'bytes': _memory.total_bytes}}
+
+
+def log_stats(level=log_utils.LOGDEBUG):
+    for name, stats in sorted(_stats.get().iteritems()):
+        log_utils.log('Cache stats |%s| hits |%d| misses |%d| read |%d| written |%d| serialize |%.4fs| deserialize |%.4fs|' %
+                      (name, stats['hits'], stats['misses'], stats['bytes_read'], stats['bytes_written'],
+                       stats['serialize_time'], stats['deserialize_time']), level)
+
+
+def has_pending_refresh():
+    if not cache_enabled: return False
+    try:
+        return _cache.has_pending_refresh()
+    except Exception as e:
+        log_utils.log('Failed to read pending cache refreshes: %s' % (e), log_utils.LOGWARNING)
+        return False
+
+
+def revalidate(instance=None, limit=10):
+    """
+    refresh stale results that were served by stale-while-revalidate lookups,
+    run by the service. instance is the object cached methods are called on
+
+    returns the number of refreshed results
+    """
+    try:
+        pending = _cache.pending_refreshes(limit)
+    except Exception as e:
+        log_utils.log('Failed to read pending cache refreshes: %s' % (e), log_utils.LOGWARNING)
+        return 0
+    refreshed = 0
+    for key, refresher, name, pickled_args in pending:
+        try:
+            if refresher not in _refreshers:
+                continue
+            func, is_method, fresh_for, stale_for, key_builder = _refreshers[refresher]
+            if is_method and instance is None:
+                continue
+            args, kwargs = pickle.loads(pickled_args)
+            tag = key_builder.build_tag(args, kwargs)
+            log_utils.log('Refreshing stale cache entry: |%s|' % (name), log_utils.LOGDEBUG)
+            if is_method:
+                result = func(instance, *args, **kwargs)
+            else:
+                result = func(*args, **kwargs)
+            _save_func(name, key, result, cache_limit=fresh_for, stale_for=stale_for, tag=tag)
+            refreshed += 1
+        except Exception as e:
+            log_utils.log('Failed to refresh cache entry |%s|: %s' % (name, e), log_utils.LOGWARNING)
+        finally:
+            try:
+                _cache.remove_refresh(key)
+            except Exception as e:
+                log_utils.log('Failed to remove cache refresh |%s|: %s' % (name, e), log_utils.LOGWARNING)
+    return refreshed
+
+
+def _get_func(name, key, cache_limit=1, refresher=None, call_args=None):
+    """
+    returns (in_cache, result, size) where size is the pickled size recorded when the result was stored
+
+    call_args: (args, kwargs) of the call, used to refresh a stale result
+    """
+    if not cache_enabled or cache_limit <= 0: return False, None, 0
+    cached = _memory.get(key)
+    if cached is None:
+        try:
+            cached = _cache.get(key)
+        except Exception as e:
+            log_utils.log('Failure during cache read: %s' % (e), log_utils.LOGWARNING)
+            return False, None, 0
+        if cached is not None:
+            pickled_result, size, fresh_until, expires = cached
+            _memory.set(key, pickled_result, fresh_until, expires)
+    if cached is not None:
+        pickled_result, size, fresh_until, expires = cached
+        if fresh_until <= time.time():
+            if refresher is None:
+                _stats.add(name, misses=1)
+                return False, None, 0
+            _schedule_refresh(key, refresher, name, call_args)
+        start = time.time()
+        result = pickle.loads(pickled_result)
+        _stats.add(name, hits=1, bytes_read=size, deserialize_time=time.time() - start)
+        return True, result, size
+
+    _stats.add(name, misses=1)
+    return False, None, 0
+
+
+def _fetch(name, key, cache_limit, stale_for, call, tag=None):
+    """
+    single flight fetch across plugin invocations and the service, only the process
+    holding the lock for a key calls the api, others wait briefly for its stored result
+    """
+    try:
+        owner = _cache.acquire(key)
+    except Exception as e:
+        log_utils.log('Failed to acquire fetch lock: %s' % (e), log_utils.LOGWARNING)
+        owner = None
+    if owner is False:
+        log_utils.log('Waiting for concurrent fetch: |%s|' % (name), log_utils.LOGDEBUG)
+        waited = 0.0
+        while waited < LOCK_WAIT:
+            time.sleep(LOCK_POLL)
+            waited += LOCK_POLL
+            try:
+                cached = _cache.get(key)
+                if (cached is not None) and (cached[2] > time.time()):  # the concurrent fetch stored a fresh result
+                    pickled_result, size, fresh_until, expires = cached
+                    _memory.set(key, pickled_result, fresh_until, expires)
+                    start = time.time()
+                    result = pickle.loads(pickled_result)
+                    _stats.add(name, bytes_read=size, deserialize_time=time.time() - start)
+                    return result
+                if not _cache.is_locked(key):
+                    break
+            except Exception as e:
+                log_utils.log('Failure while waiting for concurrent fetch: %s' % (e), log_utils.LOGWARNING)
+                break
+    try:
+        result = call()
+        _save_func(name, key, result, cache_limit=cache_limit, stale_for=stale_for, tag=tag)
+        return result
+    finally:
+        if owner:
+            try:
+                _cache.release(key)
+            except Exception as e:
+                log_utils.log('Failed to release fetch lock: %s' % (e), log_utils.LOGWARNING)
+
+
+def _schedule_refresh(key, refresher, name, call_args):
+    try:
+        args, kwargs = call_args
+        _cache.request_refresh(key, refresher, name, pickle.dumps((tuple(args), kwargs), pickle.HIGHEST_PROTOCOL))
+        log_utils.log('Serving stale cache entry, refresh scheduled: |%s|' % (name), log_utils.LOGDEBUG)
+    except Exception as e:
+        log_utils.log('Failed to schedule cache refresh: %s' % (e), log_utils.LOGWARNING)
+
+
+def _save_func(name, key, result=None, cache_limit=1, stale_for=0, tag=None):
+    try:
+        start = time.time()
+        pickled_result = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        _stats.add(name, bytes_written=len(pickled_result), serialize_time=time.time() - start)
+        fresh_until = time.time() + (cache_limit * 60 * 60)
+        expires = fresh_until + (max(stale_for, 0) * 60 * 60)
+        _memory.set(key, pickled_result, fresh_until, expires)
+        _cache.set(key, pickled_result, fresh_until, expires, name=name, tag=tag)
     except Exception as e:
         log_utils.log('Failure during cache write: %s' % (e), log_utils.LOGWARNING)
 
 
-def _get_filename(name, args, kwargs):
-    arg_hash = hashlib.md5(name).hexdigest() + hashlib.md5(str(args)).hexdigest() + hashlib.md5(str(kwargs)).hexdigest()
-    return arg_hash
+def _canonical(value):
+    # equivalent arguments must produce the same key, e.g. offset=0 and offset='0', or u'name' and 'name'
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    if isinstance(value, (int, long, float)):
+        return unicode(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, dict):
+        return dict((_canonical(k), _canonical(v)) for k, v in value.iteritems())
+    return repr(value).decode('utf-8', 'replace')
+
+
+class _KeyBuilder(object):
+    """
+    binds call arguments to the parameter names of the cached function, defaults included,
+    so positional and keyword calls share a key
+
+    tag: name of the parameter whose value tags entries as '<function>:<value>' for invalidate()
+    """
+
+    def __init__(self, func, is_method, tag=None):
+        spec = inspect.getargspec(func)
+        self.func_name = func.__name__
+        self.names = spec.args[1:] if is_method else spec.args
+        defaults = spec.defaults or ()
+        self.defaults = dict(zip(spec.args[len(spec.args) - len(defaults):], defaults))
+        self.tag = tag
+
+    def _bind(self, args, kwargs):
+        params = dict(self.defaults)
+        params.update(zip(self.names, args))
+        if len(args) > len(self.names):
+            params['*args'] = args[len(self.names):]
+        params.update(kwargs)
+        return _canonical(params)
+
+    def _tag(self, params):
+        if self.tag is None or params.get(self.tag) is None:
+            return None
+        return u'%s:%s' % (self.func_name, params[self.tag])
+
+    def build(self, name, args, kwargs):
+        """
+        returns (key, tag)
+        """
+        params = self._bind(args, kwargs)
+        digest = hashlib.md5(json.dumps(params, sort_keys=True, separators=(',', ':'))).hexdigest()
+        return 'v%d:%s:%s' % (KEY_VERSION, name, digest), self._tag(params)
 
+    def build_tag(self, args, kwargs):
+        return self._tag(self._bind(args, kwargs))
+
+
+def _register_refresher(func, is_method, fresh_for, stale_for, key_builder):
+    if stale_for <= 0:
+        return None
+    refresher = '%s.%s' % (func.__module__, func.__name__)
+    _refreshers[refresher] = (func, is_method, fresh_for, stale_for, key_builder)
+    return refresher
+
+
+def cache_method(cache_limit=0, fresh_for=None, stale_for=0, tag=None):
+    """
+    fresh_for: hours a result is served as is, defaults to cache_limit
+    stale_for: hours after fresh_for a stale result is still served while the service refreshes it
+    tag: parameter name, results are tagged '<method>:<value>' so they can be invalidated individually
+
+    calls accept use_cached=False to always call through and store the new result, ie. where an outdated result is worse than a request
+    """
+    if fresh_for is None: fresh_for = cache_limit
 
-def cache_method(cache_limit):
     def wrap(func):
+        key_builder = _KeyBuilder(func, is_method=True, tag=tag)
+        refresher = _register_refresher(func, True, fresh_for, stale_for, key_builder)
+
         @functools.wraps(func)
         def memoizer(*args, **kwargs):
-            if args:
-                klass, real_args = args[0], args[1:]
-                full_name = '%s.%s.%s' % (klass.__module__, klass.__class__.__name__, func.__name__)
-            else:
-                full_name = func.__name__
-                real_args = args
-            in_cache, result = _get_func(full_name, real_args, kwargs, cache_limit=cache_limit)
+            use_cached = kwargs.pop('use_cached', True)
+            if not cache_enabled or fresh_for <= 0:
+                return func(*args, **kwargs)
+            klass, real_args = args[0], args[1:]
+            full_name = '%s.%s' % (klass.__class__.__name__, func.__name__)
+            key, entry_tag = key_builder.build(full_name, real_args, kwargs)
+            in_cache, result, size = False, None, 0
+            if use_cached:
+                in_cache, result, size = _get_func(full_name, key, cache_limit=fresh_for, refresher=refresher,
+                                                   call_args=(real_args, kwargs))
             if in_cache:
-                # log_utils.log('Using method cache for: |%s|%s|%s| -> |%d|' % (full_name, args, kwargs, len(pickle.dumps(result))), log_utils.LOGDEBUG)
-                log_utils.log('Using method cache for: |%s| -> |%d|' % (full_name, len(pickle.dumps(result))), log_utils.LOGDEBUG)
+                # log_utils.log('Using method cache for: |%s|%s|%s| -> |%d|' % (full_name, args, kwargs, size), log_utils.LOGDEBUG)
+                log_utils.mark('cache_hit')
+                log_utils.log('Using method cache for: |%s| -> |%d|' % (full_name, size), log_utils.LOGDEBUG)
                 return result
             else:
                 # log_utils.log('Calling cached method: |%s|%s|%s|' % (full_name, args, kwargs), log_utils.LOGDEBUG)
+                log_utils.mark('cache_miss')
                 log_utils.log('Calling cached method: |%s|' % (full_name), log_utils.LOGDEBUG)
-                result = func(*args, **kwargs)
-                if cache_enabled and cache_limit > 0:
-                    _save_func(full_name, real_args, kwargs, result)
-                return result
+                return _fetch(full_name, key, fresh_for, stale_for, lambda: func(*args, **kwargs), tag=entry_tag)
 
         return memoizer
 
@@ -118,23 +667,34 @@ def cache_method(cache_limit):
 
 
 # do not use this with instance methods the self parameter will cause args to never match
-def cache_function(cache_limit):
+def cache_function(cache_limit=0, fresh_for=None, stale_for=0, tag=None):
+    if fresh_for is None: fresh_for = cache_limit
+
     def wrap(func):
+        key_builder = _KeyBuilder(func, is_method=False, tag=tag)
+        refresher = _register_refresher(func, False, fresh_for, stale_for, key_builder)
+
         @functools.wraps(func)
         def memoizer(*args, **kwargs):
+            use_cached = kwargs.pop('use_cached', True)
+            if not cache_enabled or fresh_for <= 0:
+                return func(*args, **kwargs)
             name = func.__name__
-            in_cache, result = _get_func(name, args, kwargs, cache_limit=cache_limit)
+            key, entry_tag = key_builder.build(name, args, kwargs)
+            in_cache, result, size = False, None, 0
+            if use_cached:
+                in_cache, result, size = _get_func(name, key, cache_limit=fresh_for, refresher=refresher,
+                                                   call_args=(args, kwargs))
             if in_cache:
-                # log_utils.log('Using function cache for: |%s|%s|%s| -> |%d|' % (name, args, kwargs, len(pickle.dumps(result))), log_utils.LOGDEBUG)
-                log_utils.log('Using function cache for: |%s| -> |%d|' % (name, len(pickle.dumps(result))), log_utils.LOGDEBUG)
+                # log_utils.log('Using function cache for: |%s|%s|%s| -> |%d|' % (name, args, kwargs, size), log_utils.LOGDEBUG)
+                log_utils.mark('cache_hit')
+                log_utils.log('Using function cache for: |%s| -> |%d|' % (name, size), log_utils.LOGDEBUG)
                 return result
             else:
                 # log_utils.log('Calling cached function: |%s|%s|%s|' % (name, args, kwargs), log_utils.LOGDEBUG)
+                log_utils.mark('cache_miss')
                 log_utils.log('Calling cached function: |%s|' % (name), log_utils.LOGDEBUG)
-                result = func(*args, **kwargs)
-                if cache_enabled and cache_limit > 0:
-                    _save_func(name, args, kwargs, result)
-                return result
+                return _fetch(name, key, fresh_for, stale_for, lambda: func(*args, **kwargs), tag=entry_tag)
 
         return memoizer
 
@@ -18,31 +18,127 @@
 """
 
 import json
+import os
+from contextlib import contextmanager
 import log_utils
 import xbmcvfs
 
+MOVEFILE_REPLACE_EXISTING = 0x1
+MOVEFILE_WRITE_THROUGH = 0x8
+
+
+def _replace(source, destination):
+    """
+    rename source over destination in one step, os.rename does not replace existing files on windows
+    """
+    if os.name != 'nt':
+        os.rename(source, destination)
+        return
+    import ctypes
+    move_file = ctypes.windll.kernel32.MoveFileExW
+    if not move_file(unicode(source), unicode(destination), MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH):
+        raise ctypes.WinError()
+
 
 class JSONStore:
     def __init__(self, filename):
         self.filename = filename
-        if not xbmcvfs.exists(self.filename):
+        self._batches = 0
+        self._dirty = False
+        self._mtime = None
+        if not xbmcvfs.exists(self.filename) and not self._recover():
             self.save({})
         self._data = None
 
+    def _recover(self):
+        # a write interrupted before the rename leaves a complete temporary file
+        temp_filename = self.filename + '.tmp'
+        if not os.path.exists(temp_filename):
+            return False
+        try:
+            with open(temp_filename, 'rb') as jsonfile:
+                json.load(jsonfile)
+            _replace(temp_filename, self.filename)
+        except (ValueError, EnvironmentError) as e:
+            log_utils.log('JSONStore failed to recover |{filename}|: {error}'.format(filename=temp_filename, error=e), log_utils.LOGWARNING)
+            return False
+        log_utils.log('JSONStore recovered |{filename}|'.format(filename=self.filename), log_utils.LOGWARNING)
+        return True
+
     def save(self, data):
         self._data = data
-        with open(self.filename, 'wb') as jsonfile:
-            log_utils.log('JSONStore Save |{filename}| Data |{data}|'.format(filename=self.filename,
-                                                                             data=json.dumps(data, indent=4, sort_keys=True)))
-            json.dump(data, jsonfile, indent=4, sort_keys=True)
+        if self._batches > 0:
+            self._dirty = True
+        else:
+            self._write(data)
+
+    def _write(self, data):
+        # write a temporary file and rename it over the store so a failed write leaves the previous store intact
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'wb') as jsonfile:
+            json.dump(data, jsonfile, separators=(',', ':'), sort_keys=True)
+            jsonfile.flush()
+            os.fsync(jsonfile.fileno())
+        _replace(temp_filename, self.filename)
+        self._mtime = self._modified()
+        log_utils.log('JSONStore Save |{filename}|'.format(filename=self.filename))
+
+    @contextmanager
+    def batch(self):
+        """
+        saves inside the block are written once when the outermost batch exits,
+        if the block raises the unwritten saves are discarded and the store is reloaded
+        """
+        self._batches += 1
+        try:
+            yield self
+        except:
+            # an enclosing batch that handles the error must not write the half applied changes either
+            self._batches -= 1
+            self._dirty = False
+            self._data = None
+            raise
+        else:
+            self._batches -= 1
+            if self._batches == 0 and self._dirty:
+                self._dirty = False
+                self._write(self._data)
 
     def load(self, force=False):
         if force or not self._data:
+            if not os.path.exists(self.filename):
+                self._recover()
+            mtime = self._modified()
             with open(self.filename, 'rb') as jsonfile:
                 data = json.load(jsonfile)
                 self._data = data
-                log_utils.log('JSONStore Load |{filename}| Data |{data}|'.format(filename=self.filename,
-                                                                                 data=json.dumps(data, indent=4, sort_keys=True)))
+                self._mtime = mtime
                 return data
         else:
             return self._data
+
+    def refresh(self):
+        """
+        reloads the store if another process wrote it since it was loaded, ie. the plugin while the service runs
+
+        returns True if it was reloaded
+        """
+        if self._data is None:
+            return False
+        mtime = self._modified()
+        if (mtime is None) or (mtime == self._mtime):
+            return False
+        self.load(force=True)
+        return True
+
+    def _modified(self):
+        # size as well, mtime resolution can be as coarse as 2 seconds
+        try:
+            stat = os.stat(self.filename)
+            return stat.st_mtime, stat.st_size
+        except OSError:
+            return None
+
+    def log(self, level=log_utils.LOGDEBUG):
+        log_utils.log('JSONStore |{filename}| Data |{data}|'.format(filename=self.filename,
+                                                                   data=json.dumps(self.load(), indent=4, sort_keys=True)), level)
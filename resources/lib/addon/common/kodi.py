@@ -32,8 +32,6 @@ import json
 import time
 
 addon = xbmcaddon.Addon()
-get_setting = addon.getSetting
-show_settings = addon.openSettings
 execute_builtin = xbmc.executebuiltin
 get_info_label = xbmc.getInfoLabel
 sleep = xbmc.sleep
@@ -52,6 +50,66 @@ def execute_jsonrpc(command):
     return json.loads(response)
 
 
+class Settings(object):
+    """
+    add-on settings read from kodi once and kept until invalidate() is called,
+    from set_setting, show_settings or SettingsMonitor.onSettingsChanged
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._listeners = []
+
+    def get(self, setting_id):
+        try:
+            return self._values[setting_id]
+        except KeyError:
+            value = self._values[setting_id] = addon.getSetting(setting_id)
+            return value
+
+    def get_bool(self, setting_id):
+        return self.get(setting_id) == 'true'
+
+    def get_int(self, setting_id, default=0):
+        try:
+            return int(self.get(setting_id))
+        except ValueError:
+            return default
+
+    def get_float(self, setting_id, default=0.0):
+        try:
+            return float(self.get(setting_id))
+        except ValueError:
+            return default
+
+    def set(self, setting_id, value):
+        addon.setSetting(setting_id, value)
+        self._values[setting_id] = value
+
+    def invalidate(self):
+        self._values.clear()
+        for listener in self._listeners:
+            listener()
+
+    def add_listener(self, listener):
+        # called on invalidate(), for state derived from settings
+        self._listeners.append(listener)
+
+
+settings = Settings()
+get_setting = settings.get
+
+
+class SettingsMonitor(xbmc.Monitor):
+    def onSettingsChanged(self):
+        settings.invalidate()
+
+
+def show_settings():
+    addon.openSettings()
+    settings.invalidate()
+
+
 def get_path():
     return addon.getAddonInfo('path').decode('utf-8')
 
@@ -66,7 +124,7 @@ def translate_path(path):
 
 def set_setting(id, value):
     if not isinstance(value, basestring): value = str(value)
-    addon.setSetting(id, value)
+    settings.set(id, value)
 
 
 def accumulate_setting(setting, addend=1):
@@ -88,19 +146,31 @@ def get_name():
 
 
 def get_description():
-    return addon.getAddonInfo('description').decode('utf-8')
+    return _get_addon_info('description', lambda: addon.getAddonInfo('description').decode('utf-8'))
 
 
 def has_addon(addon_id):
     return xbmc.getCondVisibility('System.HasAddon(%s)' % addon_id) == 1
 
 
+_addon_info = {}
+
+
+def _get_addon_info(key, getter):
+    # addon paths and description don't change during an invocation, resolve them once
+    try:
+        return _addon_info[key]
+    except KeyError:
+        value = _addon_info[key] = getter()
+        return value
+
+
 def get_icon():
-    return translate_path('special://home/addons/{0!s}/icon.png'.format(get_id()))
+    return _get_addon_info('icon', lambda: translate_path('special://home/addons/{0!s}/icon.png'.format(get_id())))
 
 
 def get_fanart():
-    return translate_path('special://home/addons/{0!s}/fanart.png'.format(get_id()))
+    return _get_addon_info('fanart', lambda: translate_path('special://home/addons/{0!s}/fanart.png'.format(get_id())))
 
 
 def get_kodi_version():
@@ -142,19 +212,69 @@ def get_kodi_version():
     return KodiVersion
 
 
-def get_plugin_url(queries):
+def encode_queries(queries):
     try:
-        query = urllib.urlencode(queries)
+        return urllib.urlencode(queries)
     except UnicodeEncodeError:
         for k in queries:
             if isinstance(queries[k], unicode):
                 queries[k] = queries[k].encode('utf-8')
-        query = urllib.urlencode(queries)
+        return urllib.urlencode(queries)
+
+
+def get_plugin_url(queries):
+    return sys.argv[0] + '?' + encode_queries(queries)
+
+
+class PluginUrl(object):
+    """
+    plugin url with fixed queries that are encoded once, on first use
+    build() appends the queries that differ per item
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+        self._prefix = None
 
-    return sys.argv[0] + '?' + query
+    def build(self, queries=None):
+        if self._prefix is None:
+            self._prefix = get_plugin_url(dict(self.queries))
+        if not queries:
+            return self._prefix
+        return self._prefix + '&' + encode_queries(queries)
+
+
+class DirectoryItems(object):
+    """
+    collects the (url, list_item, is_folder) of a directory listing
+    flush() hands them to Kodi with a single addDirectoryItems call
+    """
+
+    def __init__(self):
+        self.items = list()
+        self.total_items = 0
+
+    def add(self, url, list_item, is_folder=True, total_items=0):
+        self.items.append((url, list_item, is_folder))
+        self.total_items = max(self.total_items, total_items)
+
+    def flush(self):
+        if not self.items:
+            return True
+        items, self.items = self.items, list()
+        total_items = max(self.total_items, len(items))
+        self.total_items = 0
+        return xbmcplugin.addDirectoryItems(int(sys.argv[1]), items, totalItems=total_items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+directory_items = DirectoryItems()
 
 
 def end_of_directory(cache_to_disc=False):
+    directory_items.flush()
     xbmcplugin.endOfDirectory(int(sys.argv[1]), cacheToDisc=cache_to_disc)
 
 
@@ -204,7 +324,7 @@ def add_item(item_dict, list_item):
     list_item.setProperty('isPlayable', str(is_playable).lower())
 
     url = path if isinstance(path, basestring) else get_plugin_url(path)
-    xbmcplugin.addDirectoryItem(int(sys.argv[1]), url, list_item, isFolder=is_folder, totalItems=item_dict.get('total_items', 0))
+    directory_items.add(url, list_item, is_folder=is_folder, total_items=item_dict.get('total_items', 0))
 
 
 def parse_query(query):
@@ -297,10 +417,16 @@ def get_keyboard(heading, default=''):
 class Translations(object):
     def __init__(self, strings):
         self.strings = strings
+        self._translated = {}
 
     def i18n(self, string_id):
         try:
-            return addon.getLocalizedString(self.strings[string_id]).encode('utf-8', 'ignore')
+            return self._translated[string_id]
+        except KeyError:
+            pass
+        try:
+            translated = self._translated[string_id] = addon.getLocalizedString(self.strings[string_id]).encode('utf-8', 'ignore')
+            return translated
         except Exception as e:
             xbmc.log('%s: Failed String Lookup: %s (%s)' % (get_name(), string_id, e), xbmc.LOGWARNING)
             return string_id
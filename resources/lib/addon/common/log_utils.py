@@ -17,10 +17,52 @@
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import sys
 import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
 import kodi
 from xbmc import LOGDEBUG, LOGERROR, LOGFATAL, LOGINFO, LOGNONE, LOGNOTICE, LOGSEVERE, LOGWARNING  # @UnusedImport
 
+_debugging = None
+_debugging_checked = 0.0
+DEBUGGING_TTL = 60  # seconds, Kodi's debug logging is a system setting and changes without notifying add-ons
+
+
+def _get_monotonic():
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    if sys.platform.startswith('win'):
+        return time.clock
+    try:
+        import ctypes
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        try:
+            clock_gettime = ctypes.CDLL(None, use_errno=True).clock_gettime
+        except AttributeError:
+            clock_gettime = ctypes.CDLL('librt.so.1', use_errno=True).clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        clock_id = 6 if sys.platform == 'darwin' else 1  # CLOCK_MONOTONIC
+
+        def monotonic():
+            # a buffer per call, the clock is read from several threads
+            value = timespec()
+            if clock_gettime(clock_id, ctypes.byref(value)) != 0:
+                return time.time()
+            return value.tv_sec + value.tv_nsec * 1e-9
+
+        monotonic()
+        return monotonic
+    except:
+        return time.time
+
+
+monotonic = _get_monotonic()
+
 
 def log(msg, level=LOGDEBUG):
     try:
@@ -34,22 +76,160 @@ def log(msg, level=LOGDEBUG):
             pass  # just give up
 
 
+def is_debugging():
+    """
+    whether Kodi writes LOGDEBUG messages, looked up again after DEBUGGING_TTL and when the add-on settings changed
+    """
+    global _debugging, _debugging_checked
+    now = monotonic()
+    if (_debugging is None) or (now - _debugging_checked >= DEBUGGING_TTL):
+        _debugging = __is_debugging()
+        _debugging_checked = now
+    return _debugging
+
+
+def refresh_debugging():
+    global _debugging
+    _debugging = None
+
+
+kodi.settings.add_listener(refresh_debugging)
+
+
 def trace(method):
     #  @trace decorator
-    def method_trace_on(*args, **kwargs):
-        start = time.time()
+    @wraps(method)
+    def method_trace(*args, **kwargs):
+        if not is_debugging():
+            return method(*args, **kwargs)
+        start = monotonic()
         result = method(*args, **kwargs)
-        end = time.time()
+        end = monotonic()
         log('{name!r} time: {time:2.4f}s args: |{args!r}| kwargs: |{kwargs!r}|'.format(name=method.__name__, time=end - start, args=args, kwargs=kwargs), LOGDEBUG)
         return result
 
-    def method_trace_off(*args, **kwargs):
-        return method(*args, **kwargs)
+    return method_trace
+
+
+class Span(object):
+    """
+    timing of one step of an invocation, repeated steps with the same name under the same parent
+    share a span, count and elapsed accumulate. marks count events like cache hits
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = 0.0
+        self.count = 0
+        self.elapsed = 0.0
+        self.marks = {}
+        self.children = []
+        self._children = {}
+
+    def child(self, name):
+        try:
+            return self._children[name]
+        except KeyError:
+            span = self._children[name] = Span(name)
+            self.children.append(span)
+            return span
+
+    def summary(self):
+        text = '%s' % self.name
+        if self.count > 1:
+            text += ' x%d' % self.count
+        text += ' %dms' % round(self.elapsed * 1000)
+        details = ['%s %d' % (name, count) for name, count in sorted(self.marks.iteritems())]
+        details.extend(child.summary() for child in self.children)
+        if details:
+            text += ' [%s]' % ', '.join(details)
+        return text
+
+
+_spans = threading.local()
+_spans_lock = threading.RLock()
+_root = None
+
+
+def _current():
+    stack = getattr(_spans, 'stack', None)
+    if stack:
+        return stack[-1]
+    # work on other threads, ie. page prefetching, is attributed to the root
+    return _root
+
+
+def start_spans(name):
+    """
+    starts the span tree of an invocation, spans are only collected while debug logging is enabled
+    """
+    global _root
+    if not is_debugging():
+        _root = None
+        return
+    _root = Span(name)
+    _spans.stack = [_root]
+    _root.count = 1
+    _root.start = monotonic()
+
+
+def finish_spans(level=LOGDEBUG):
+    """
+    logs the span tree of the invocation as one line
+    """
+    global _root
+    root, _root = _root, None
+    _spans.stack = []
+    if root is None:
+        return
+    root.elapsed = monotonic() - root.start
+    log('Spans: %s' % root.summary(), level)
+
+
+@contextmanager
+def span(name):
+    parent = _current()
+    if parent is None:
+        yield
+        return
+    with _spans_lock:
+        current = parent.child(name)
+    stack = getattr(_spans, 'stack', None)
+    if stack is None:
+        stack = _spans.stack = []
+    stack.append(current)
+    start = monotonic()
+    try:
+        yield
+    finally:
+        elapsed = monotonic() - start
+        stack.pop()
+        with _spans_lock:
+            current.count += 1
+            current.elapsed += elapsed
+
+
+def timed(name):
+    #  @timed('name') decorator, records calls as a span of the current span
+    def wrap(func):
+        @wraps(func)
+        def timed_func(*args, **kwargs):
+            if _root is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+
+        return timed_func
+
+    return wrap
+
 
-    if __is_debugging():
-        return method_trace_on
-    else:
-        return method_trace_off
+def mark(name, count=1):
+    current = _current()
+    if current is None:
+        return
+    with _spans_lock:
+        current.marks[name] = current.marks.get(name, 0) + count
 
 
 def __is_debugging():
@@ -18,10 +18,11 @@
 """
 
 import menu_items
-from common import kodi
+from common import kodi, log_utils
 from utils import the_art, TitleBuilder, i18n, get_oauth_token, get_vodcast_color
 from constants import Keys, Images, MODES
-from base64 import b64encode
+
+play_url = kodi.PluginUrl({'mode': MODES.PLAY})
 
 
 class PlaylistConverter(object):
@@ -55,6 +56,7 @@ class JsonListItemConverter(object):
         self.has_token = True if get_oauth_token() else False
 
     @staticmethod
+    @log_utils.timed('convert')
     def game_to_listitem(game):
         channel_count = i18n('unknown')
         if Keys.CHANNELS in game:
@@ -82,6 +84,7 @@ class JsonListItemConverter(object):
                 'context_menu': context_menu,
                 'info': {u'plot': plot, u'plotoutline': plot, u'tagline': plot}}
 
+    @log_utils.timed('convert')
     def community_to_listitem(self, community):
         name = community[Keys.NAME].encode('utf-8')
         _id = community[Keys._ID]
@@ -96,6 +99,7 @@ class JsonListItemConverter(object):
                 'context_menu': context_menu,
                 'info': self.get_plot_for_community(community)}
 
+    @log_utils.timed('convert')
     def collection_to_listitem(self, collection):
         title = collection[Keys.TITLE].encode('utf-8')
         _id = collection[Keys._ID]
@@ -115,6 +119,7 @@ class JsonListItemConverter(object):
                 'info': self.get_plot_for_collection(collection)}
 
     @staticmethod
+    @log_utils.timed('convert')
     def team_to_listitem(team):
         name = team[Keys.NAME]
         background = team.get(Keys.BACKGROUND) if team.get(Keys.BACKGROUND) else Images.FANART
@@ -127,6 +132,7 @@ class JsonListItemConverter(object):
                 'art': the_art({'fanart': background, 'poster': image, 'thumb': image, 'icon': image}),
                 'context_menu': context_menu}
 
+    @log_utils.timed('convert')
     def team_channel_to_listitem(self, team_channel):
         images = team_channel.get(Keys.IMAGE)
         image = Images.ICON
@@ -137,14 +143,14 @@ class JsonListItemConverter(object):
         title = self.title_builder.format_title(title_values)
         context_menu = list()
         context_menu.extend(menu_items.refresh())
-        context_menu.extend(menu_items.run_plugin(i18n('play_choose_quality'),
-                                                  {'mode': MODES.PLAY, 'name': channel_name, 'ask': True, 'use_player': True}))
+        context_menu.extend(menu_items.play_choose_quality(name=channel_name))
         return {'label': title,
-                'path': kodi.get_plugin_url({'mode': MODES.PLAY, 'name': channel_name}),
+                'path': play_url.build({'name': channel_name}),
                 'context_menu': context_menu,
                 'is_playable': True,
                 'art': the_art({'poster': image, 'thumb': image, 'icon': image})}
 
+    @log_utils.timed('convert')
     def channel_to_listitem(self, channel):
         image = channel.get(Keys.LOGO) if channel.get(Keys.LOGO) else Images.ICON
         video_banner = channel.get(Keys.VIDEO_BANNER)
@@ -165,6 +171,7 @@ class JsonListItemConverter(object):
                 'context_menu': context_menu,
                 'info': self.get_plot_for_channel(channel)}
 
+    @log_utils.timed('convert')
     def clip_to_listitem(self, clip):
         duration = clip.get(Keys.DURATION)
         plot = clip.get(Keys.DESCRIPTION)
@@ -185,21 +192,21 @@ class JsonListItemConverter(object):
         if clip[Keys.GAME]:
             context_menu.extend(menu_items.go_to_game(clip[Keys.GAME]))
         context_menu.extend(menu_items.add_blacklist(broadcaster[Keys.ID], name))
-        context_menu.extend(menu_items.add_blacklist(b64encode(clip[Keys.GAME].encode('utf-8', 'ignore')), clip[Keys.GAME], list_type='game'))
+        context_menu.extend(menu_items.add_game_blacklist(clip[Keys.GAME]))
         context_menu.extend(menu_items.set_default_quality('clip', broadcaster[Keys.ID], broadcaster[Keys.NAME], clip_id=clip[Keys.SLUG]))
-        context_menu.extend(menu_items.run_plugin(i18n('play_choose_quality'),
-                                                  {'mode': MODES.PLAY, 'slug': clip[Keys.SLUG], 'ask': True, 'use_player': True}))
+        context_menu.extend(menu_items.play_choose_quality(slug=clip[Keys.SLUG]))
         info = self.get_plot_for_clip(clip)
         info.update({'duration': str(duration), 'year': year, 'date': date, 'premiered': date, 'mediatype': 'video'})
 
         return {'label': self.get_title_for_clip(clip),
-                'path': kodi.get_plugin_url({'mode': MODES.PLAY, 'slug': clip[Keys.SLUG]}),
+                'path': play_url.build({'slug': clip[Keys.SLUG]}),
                 'context_menu': context_menu,
                 'is_playable': True,
                 'info': info,
                 'content_type': 'video',
                 'art': the_art({'poster': image, 'thumb': image, 'icon': image})}
 
+    @log_utils.timed('convert')
     def collection_video_to_listitem(self, video):
         duration = video.get(Keys.DURATION)
         date = video.get(Keys.PUBLISHED_AT)[:10] if video.get(Keys.PUBLISHED_AT) else ''
@@ -219,20 +226,20 @@ class JsonListItemConverter(object):
         if video[Keys.GAME]:
             context_menu.extend(menu_items.go_to_game(video[Keys.GAME]))
         context_menu.extend(menu_items.add_blacklist(owner[Keys._ID], name))
-        context_menu.extend(menu_items.add_blacklist(b64encode(video[Keys.GAME].encode('utf-8', 'ignore')), video[Keys.GAME], list_type='game'))
+        context_menu.extend(menu_items.add_game_blacklist(video[Keys.GAME]))
         context_menu.extend(menu_items.set_default_quality('video', owner[Keys._ID], owner[Keys.NAME], video[Keys.ITEM_ID]))
-        context_menu.extend(menu_items.run_plugin(i18n('play_choose_quality'),
-                                                  {'mode': MODES.PLAY, 'video_id': video[Keys.ITEM_ID], 'ask': True, 'use_player': True}))
+        context_menu.extend(menu_items.play_choose_quality(video_id=video[Keys.ITEM_ID]))
         info = self.get_plot_for_video(video)
         info.update({'duration': str(duration), 'year': year, 'date': date, 'premiered': date, 'mediatype': 'video'})
         return {'label': video[Keys.TITLE],
-                'path': kodi.get_plugin_url({'mode': MODES.PLAY, 'video_id': video[Keys.ITEM_ID]}),
+                'path': play_url.build({'video_id': video[Keys.ITEM_ID]}),
                 'context_menu': context_menu,
                 'is_playable': True,
                 'info': info,
                 'content_type': 'video',
                 'art': the_art({'poster': image, 'thumb': image, 'icon': image})}
 
+    @log_utils.timed('convert')
     def video_list_to_listitem(self, video):
         duration = video.get(Keys.LENGTH)
         date = video.get(Keys.CREATED_AT)[:10] if video.get(Keys.CREATED_AT) else ''
@@ -251,20 +258,20 @@ class JsonListItemConverter(object):
         if video[Keys.GAME]:
             context_menu.extend(menu_items.go_to_game(video[Keys.GAME]))
         context_menu.extend(menu_items.add_blacklist(channel[Keys._ID], name))
-        context_menu.extend(menu_items.add_blacklist(b64encode(video[Keys.GAME].encode('utf-8', 'ignore')), video[Keys.GAME], list_type='game'))
+        context_menu.extend(menu_items.add_game_blacklist(video[Keys.GAME]))
         context_menu.extend(menu_items.set_default_quality('video', channel[Keys._ID], channel[Keys.NAME], video[Keys._ID]))
-        context_menu.extend(menu_items.run_plugin(i18n('play_choose_quality'),
-                                                  {'mode': MODES.PLAY, 'video_id': video[Keys._ID], 'ask': True, 'use_player': True}))
+        context_menu.extend(menu_items.play_choose_quality(video_id=video[Keys._ID]))
         info = self.get_plot_for_video(video)
         info.update({'duration': str(duration), 'year': year, 'date': date, 'premiered': date, 'mediatype': 'video'})
         return {'label': self.get_title_for_video(video),
-                'path': kodi.get_plugin_url({'mode': MODES.PLAY, 'video_id': video[Keys._ID]}),
+                'path': play_url.build({'video_id': video[Keys._ID]}),
                 'context_menu': context_menu,
                 'is_playable': True,
                 'info': info,
                 'content_type': 'video',
                 'art': the_art({'poster': image, 'thumb': image, 'icon': image})}
 
+    @log_utils.timed('convert')
     def stream_to_listitem(self, stream):
         channel = stream[Keys.CHANNEL]
         video_banner = channel.get(Keys.PROFILE_BANNER)
@@ -291,12 +298,11 @@ class JsonListItemConverter(object):
         if channel[Keys.GAME]:
             context_menu.extend(menu_items.go_to_game(channel[Keys.GAME]))
         context_menu.extend(menu_items.add_blacklist(channel[Keys._ID], name))
-        context_menu.extend(menu_items.add_blacklist(b64encode(channel[Keys.GAME].encode('utf-8', 'ignore')), channel[Keys.GAME], list_type='game'))
+        context_menu.extend(menu_items.add_game_blacklist(channel[Keys.GAME]))
         context_menu.extend(menu_items.set_default_quality('stream', channel[Keys._ID], channel[Keys.NAME]))
-        context_menu.extend(menu_items.run_plugin(i18n('play_choose_quality'),
-                                                  {'mode': MODES.PLAY, 'channel_id': channel[Keys._ID], 'ask': True, 'use_player': True}))
+        context_menu.extend(menu_items.play_choose_quality(channel_id=channel[Keys._ID]))
         return {'label': title,
-                'path': kodi.get_plugin_url({'mode': MODES.PLAY, 'channel_id': channel[Keys._ID]}),
+                'path': play_url.build({'channel_id': channel[Keys._ID]}),
                 'context_menu': context_menu,
                 'is_playable': True,
                 'info': info,
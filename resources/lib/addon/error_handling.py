@@ -17,7 +17,6 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
-import copy
 import json
 from functools import wraps
 import utils
@@ -26,6 +25,9 @@ from twitch_exceptions import TwitchException, SubRequired, ResourceUnavailableE
 
 i18n = utils.i18n
 
+API_LOG_FULL = 0
+API_LOG_SUMMARY = 1
+
 
 def error_handler(func):
     @wraps(func)
@@ -59,26 +61,49 @@ def error_handler(func):
     return wrapper
 
 
+def _redacted(result):
+    # shallow view of the result, only the redacted values are copied
+    logging_result = dict(result)
+    if u'email' in logging_result:
+        logging_result[u'email'] = 'addon@removed.org'
+    if isinstance(logging_result.get(u'token'), dict) and u'client_id' in logging_result[u'token']:
+        token = logging_result[u'token'] = dict(logging_result[u'token'])
+        client_id = token[u'client_id']
+        token[u'client_id'] = client_id[:4] + ('*' * (len(client_id) - 8)) + client_id[(len(client_id) - 4):]
+    return logging_result
+
+
+def _item_count(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        for value in result.itervalues():
+            if isinstance(value, list):
+                return len(value)
+    return 1
+
+
+def _log_result(name, result, latency):
+    try:
+        if kodi.settings.get_int('api_response_logging') == API_LOG_SUMMARY:
+            size = len(json.dumps(result, separators=(',', ':')))
+            log_utils.log('API |{0}| items |{1}| bytes |{2}| latency |{3:.3f}s|'.format(name, _item_count(result), size, latency), log_utils.LOGDEBUG)
+        else:
+            logging_result = _redacted(result) if isinstance(result, dict) else result
+            log_utils.log(json.dumps(logging_result, indent=4), log_utils.LOGDEBUG)
+    except:
+        pass
+
+
 def api_error_handler(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        try:
+        if not log_utils.is_debugging():
+            return func(*args, **kwargs)
+        start = log_utils.monotonic()
+        with log_utils.span('api:%s' % func.__name__):
             result = func(*args, **kwargs)
-            logging_result = copy.deepcopy(result)
-            try:
-                if u'email' in logging_result:
-                    logging_result[u'email'] = 'addon@removed.org'
-                if u'token' in logging_result:
-                    if u'client_id' in logging_result[u'token']:
-                        logging_result[u'token'][u'client_id'] = logging_result[u'token'][u'client_id'][:4] + \
-                                                         ('*' * (len(logging_result[u'token'][u'client_id']) - 8)) + \
-                                                                 logging_result[u'token'][u'client_id'][(len(logging_result[u'token'][u'client_id']) - 4):]
-                logging_result = json.dumps(logging_result, indent=4)
-            except:
-                pass
-            log_utils.log(logging_result, log_utils.LOGDEBUG)
-            return result
-        except:
-            raise
+        _log_result(func.__name__, result, log_utils.monotonic() - start)
+        return result
 
     return wrapper
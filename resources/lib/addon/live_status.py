@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+    Live status of followed channels for the live notification service
+
+    Copyright (C) 2016 Twitch-on-Kodi
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import json
+import time
+import sqlite3
+from hashlib import md5
+from common import kodi, log_utils
+from constants import Keys
+
+STATE_VERSION = 1
+
+SNAPSHOT_DB_NAME = 'live.db'
+SNAPSHOT_SCHEMA_VERSION = 2
+SNAPSHOT_MARGIN = 120  # seconds a snapshot stays valid past the next scheduled poll, covering notifications and its api requests
+
+
+class LiveChannels(object):
+    """
+    the live followed channels, ids in listing order and {id: display name}
+    """
+
+    def __init__(self, ids=None, names=None):
+        self.ids = list(ids or [])
+        self.names = dict(names or {})
+
+    @classmethod
+    def from_streams(cls, streams):
+        ids = list()
+        names = dict()
+        for stream in streams:
+            channel = stream[Keys.CHANNEL]
+            _id = unicode(channel[Keys._ID])
+            if _id in names:
+                continue
+            ids.append(_id)
+            names[_id] = channel.get(Keys.DISPLAY_NAME) or channel.get(Keys.NAME) or _id
+        return cls(ids, names)
+
+    @classmethod
+    def loads(cls, value):
+        """
+        returns None for an empty, unknown or outdated value
+        """
+        if not value:
+            return None
+        try:
+            state = json.loads(value)
+            if state.get('v') != STATE_VERSION:
+                return None
+            return cls(state['ids'], state['names'])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def dumps(self):
+        return json.dumps({'v': STATE_VERSION, 'ids': self.ids, 'names': self.names}, separators=(',', ':'))
+
+    def id_set(self):
+        return set(self.ids)
+
+    def display_names(self, ids):
+        # in listing order
+        return [self.names[_id] for _id in self.ids if _id in ids]
+
+    def diff(self, previous):
+        """
+        returns (went_live, went_offline) as sets of channel ids
+        """
+        current = self.id_set()
+        if previous is None:
+            return current, set()
+        before = previous.id_set()
+        return current - before, before - current
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class LiveSnapshot(object):
+    """
+    live followed streams of a user as the service last fetched them, unfiltered and in api order
+
+    version increases whenever etag, a digest of the streams, changes
+    valid_until is when the service will have polled again, listings request the api after it
+    """
+
+    def __init__(self, user_id, streams, fetched, valid_until, version=0, etag=''):
+        self.user_id = user_id
+        self.streams = streams
+        self.fetched = fetched
+        self.valid_until = valid_until
+        self.version = version
+        self.etag = etag
+
+    def age(self):
+        return time.time() - self.fetched
+
+    def is_fresh(self):
+        return self.fetched <= time.time() <= self.valid_until
+
+    def pages(self, offset, limit, max_requests):
+        """
+        yields (offset, result) like the api pages of get_followed_streams
+        """
+        offset = int(offset)
+        total = len(self.streams)
+        for index in range(max_requests):
+            page_offset = offset + (limit * index)
+            if index and page_offset >= total:
+                return
+            yield page_offset, {Keys.TOTAL: total, Keys.STREAMS: self.streams[page_offset:page_offset + limit]}
+
+
+class LiveSnapshotStore(object):
+    """
+    one row per user in a SQLite database in the profile directory, written by the service, read by the plugin
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=10)
+        connection.execute('PRAGMA journal_mode=WAL')
+        self._create_schema(connection)
+        return connection
+
+    @staticmethod
+    def _create_schema(connection):
+        if connection.execute('PRAGMA user_version').fetchone()[0] == SNAPSHOT_SCHEMA_VERSION:
+            return
+        # take the write lock before checking again, the plugin and the service may connect at the same time
+        isolation_level = connection.isolation_level
+        connection.isolation_level = None
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                if connection.execute('PRAGMA user_version').fetchone()[0] != SNAPSHOT_SCHEMA_VERSION:
+                    connection.execute('DROP TABLE IF EXISTS snapshot')
+                    connection.execute('CREATE TABLE snapshot (user_id TEXT PRIMARY KEY, version INTEGER NOT NULL, etag TEXT NOT NULL, '
+                                       'fetched REAL NOT NULL, valid_until REAL NOT NULL, streams TEXT NOT NULL)')
+                    connection.execute('PRAGMA user_version=%d' % SNAPSHOT_SCHEMA_VERSION)
+                connection.execute('COMMIT')
+            except:
+                connection.execute('ROLLBACK')
+                raise
+        finally:
+            connection.isolation_level = isolation_level
+
+    def get(self, user_id):
+        connection = self._connect()
+        try:
+            row = connection.execute('SELECT version, etag, fetched, valid_until, streams FROM snapshot WHERE user_id = ?',
+                                     (unicode(user_id),)).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        version, etag, fetched, valid_until, streams = row
+        return LiveSnapshot(user_id, json.loads(streams), fetched, valid_until, version, etag)
+
+    def set(self, user_id, streams, fetched, valid_until):
+        """
+        fetched: time the streams were requested from the api
+        valid_until: time the snapshot is replaced by the next poll
+
+        returns the stored snapshot
+        """
+        serialized = json.dumps(streams, separators=(',', ':'))
+        etag = md5(serialized).hexdigest()
+        connection = self._connect()
+        try:
+            with connection:
+                row = connection.execute('SELECT version, etag FROM snapshot WHERE user_id = ?', (unicode(user_id),)).fetchone()
+                if row is None:
+                    version = 1
+                else:
+                    version = row[0] if row[1] == etag else row[0] + 1
+                connection.execute('INSERT OR REPLACE INTO snapshot (user_id, version, etag, fetched, valid_until, streams) VALUES (?, ?, ?, ?, ?, ?)',
+                                   (unicode(user_id), version, etag, fetched, valid_until, serialized))
+        finally:
+            connection.close()
+        return LiveSnapshot(user_id, streams, fetched, valid_until, version, etag)
+
+
+def _get_store():
+    profile = kodi.translate_path(kodi.get_profile())
+    if not os.path.exists(profile):
+        os.makedirs(profile)
+    return LiveSnapshotStore(os.path.join(profile, SNAPSHOT_DB_NAME))
+
+
+def publish_snapshot(user_id, streams, fetched, next_poll):
+    """
+    streams must come from the api, not the cache, the snapshot's age is measured from fetched
+    next_poll: seconds until the service polls again
+    """
+    try:
+        snapshot = _get_store().set(user_id, streams, fetched, time.time() + next_poll + SNAPSHOT_MARGIN)
+        log_utils.log('Published live snapshot |%d| streams version |%d|' % (len(streams), snapshot.version), log_utils.LOGDEBUG)
+        return snapshot
+    except Exception as e:
+        log_utils.log('Failed to publish live snapshot: %s' % (e), log_utils.LOGWARNING)
+        return None
+
+
+def get_fresh_snapshot(user_id):
+    """
+    returns the snapshot of user_id if the service has not polled since, otherwise None
+    """
+    try:
+        snapshot = _get_store().get(user_id)
+    except Exception as e:
+        log_utils.log('Failed to read live snapshot: %s' % (e), log_utils.LOGWARNING)
+        return None
+    if (snapshot is None) or (not snapshot.is_fresh()):
+        return None
+    log_utils.log('Using live snapshot |%d| streams version |%d| age |%ds|' % (len(snapshot.streams), snapshot.version, snapshot.age()), log_utils.LOGDEBUG)
+    return snapshot
@@ -18,11 +18,37 @@
 """
 
 import utils
+from base64 import b64encode
+from functools import wraps
 from common import kodi
 from constants import MODES
 
 i18n = utils.i18n
 
+_urls = {
+    MODES.CHANNELVIDEOS: kodi.PluginUrl({'mode': MODES.CHANNELVIDEOS}),
+    MODES.EDITFOLLOW: kodi.PluginUrl({'mode': MODES.EDITFOLLOW}),
+    MODES.EDITBLOCK: kodi.PluginUrl({'mode': MODES.EDITBLOCK}),
+    MODES.EDITBLACKLIST: kodi.PluginUrl({'mode': MODES.EDITBLACKLIST}),
+    MODES.EDITQUALITIES: kodi.PluginUrl({'mode': MODES.EDITQUALITIES}),
+    MODES.PLAY: kodi.PluginUrl({'mode': MODES.PLAY, 'ask': True, 'use_player': True}),
+}
+
+
+def memoize(func):
+    # for menu items built from a handful of distinct values per listing, ie. games and sort types
+    results = {}
+
+    @wraps(func)
+    def memoizer(*args):
+        try:
+            return results[args]
+        except KeyError:
+            result = results[args] = func(*args)
+            return result
+
+    return memoizer
+
 
 def run_plugin(label, queries):
     return [(label, 'RunPlugin(%s)' % kodi.get_plugin_url(queries))]
@@ -32,55 +58,76 @@ def update_container(label, queries):
     return [(label, 'Container.Update(%s)' % kodi.get_plugin_url(queries))]
 
 
+def _update_container(label, mode, queries):
+    return [(label, 'Container.Update(%s)' % _urls[mode].build(queries))]
+
+
+@memoize
 def clear_previews():
-    if kodi.get_setting('live_previews_enable') == 'true':
+    if kodi.settings.get_bool('live_previews_enable'):
         return run_plugin(i18n('clear_live_preview'), {'mode': MODES.CLEARLIVEPREVIEWS, 'notify': utils.notify_refresh()})
     return []
 
 
 def channel_videos(channel_id, channel_name, display_name):
-    return update_container(i18n('go_to') % '[COLOR white][B]%s[/B][/COLOR]' % display_name,
-                            {'mode': MODES.CHANNELVIDEOS, 'channel_id': channel_id, 'channel_name': channel_name, 'display_name': display_name})
+    return _update_container(i18n('go_to') % '[COLOR white][B]%s[/B][/COLOR]' % display_name, MODES.CHANNELVIDEOS,
+                             {'channel_id': channel_id, 'channel_name': channel_name, 'display_name': display_name})
 
 
+@memoize
 def go_to_game(game):
     return update_container(i18n('go_to') % '[COLOR white][B]%s[/B][/COLOR]' % game, {'mode': MODES.GAMELISTS, 'game': game})
 
 
+@memoize
 def refresh():
     return [(i18n('refresh'), 'Container.Refresh')]
 
 
 def edit_follow(channel_id, display_name):
-    return update_container(i18n('toggle_follow'), {'mode': MODES.EDITFOLLOW, 'channel_id': channel_id, 'channel_name': display_name})
+    return _update_container(i18n('toggle_follow'), MODES.EDITFOLLOW, {'channel_id': channel_id, 'channel_name': display_name})
 
 
 def edit_block(target_id, display_name):
-    return update_container(i18n('toggle_block'), {'mode': MODES.EDITBLOCK, 'target_id': target_id, 'name': display_name})
+    return _update_container(i18n('toggle_block'), MODES.EDITBLOCK, {'target_id': target_id, 'name': display_name})
 
 
 def add_blacklist(target_id, display_name, list_type='user'):
-    return update_container(i18n('add_blacklist') % '[COLOR white][B]%s[/B][/COLOR]' % display_name,
-                            {'mode': MODES.EDITBLACKLIST, 'target_id': target_id, 'name': display_name, 'list_type': list_type})
+    return _update_container(i18n('add_blacklist') % '[COLOR white][B]%s[/B][/COLOR]' % display_name, MODES.EDITBLACKLIST,
+                             {'target_id': target_id, 'name': display_name, 'list_type': list_type})
+
+
+@memoize
+def add_game_blacklist(game):
+    # games without an id are blacklisted by their encoded name
+    return add_blacklist(b64encode(game.encode('utf-8', 'ignore')), game, list_type='game')
 
 
 def set_default_quality(content_type, target_id, name, video_id=None, clip_id=None):
-    return update_container(i18n('set_default_quality'),
-                            {'mode': MODES.EDITQUALITIES, 'content_type': content_type, 'target_id': target_id,
-                             'name': name, 'video_id': video_id, 'clip_id': clip_id})
+    return _update_container(i18n('set_default_quality'), MODES.EDITQUALITIES,
+                             {'content_type': content_type, 'target_id': target_id,
+                              'name': name, 'video_id': video_id, 'clip_id': clip_id})
+
+
+def play_choose_quality(**queries):
+    return [(i18n('play_choose_quality'), 'RunPlugin(%s)' % _urls[MODES.PLAY].build(queries))]
 
 
+@memoize
 def edit_follow_game(game):
     return update_container(i18n('toggle_follow'), {'mode': MODES.EDITFOLLOW, 'game': game})
 
 
+@memoize
 def change_sort_by(for_type):
     return update_container(i18n('change_sort_by'), {'mode': MODES.EDITSORTING, 'list_type': for_type, 'sort_type': 'by'})
 
 
+@memoize
 def change_period(for_type):
     return update_container(i18n('change_period'), {'mode': MODES.EDITSORTING, 'list_type': for_type, 'sort_type': 'period'})
 
 
+@memoize
 def change_direction(for_type):
     return update_container(i18n('change_direction'), {'mode': MODES.EDITSORTING, 'list_type': for_type, 'sort_type': 'direction'})
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+    Page fetching and aggregation for multi-request listings
+
+    Copyright (C) 2016 Twitch-on-Kodi
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+import threading
+from Queue import Queue
+from common import log_utils
+from constants import Keys, REQUEST_LIMIT, MAX_REQUESTS, PREFETCH_WORKERS
+
+
+def by_id(item):
+    return item[Keys._ID]
+
+
+def by_channel_id(item):
+    return item[Keys.CHANNEL][Keys._ID]
+
+
+def by_game_id(item):
+    return item[Keys.GAME][Keys._ID]
+
+
+def by_slug(item):
+    return item[Keys.SLUG]
+
+
+class PageAggregator(object):
+    """
+    collects the items of one listing page from one or more api results
+
+    items are de-duplicated on identity(item), and the aggregator decides when no more
+    requests are needed: the page is full, the listing is exhausted or max_requests was reached
+
+    offset listings: items are added in order until the page is full, offset is where the next listing page starts
+    cursor listings: every new item of a result is kept, cursor is the cursor of the next listing page
+    """
+
+    def __init__(self, per_page, identity, offset=0, cursor=None, max_requests=MAX_REQUESTS):
+        self.per_page = per_page
+        self.identity = identity
+        self.offset = int(offset)
+        self.cursor = cursor
+        self.max_requests = max_requests
+        self.requests = 0
+        self.items = list()
+        self._seen = set()
+        self._exhausted = (cursor is not None) and (not cursor)
+
+    def is_full(self):
+        return (self.per_page is not None) and (len(self.items) >= self.per_page)
+
+    def wants_more(self):
+        return (not self._exhausted) and (not self.is_full()) and (self.requests < self.max_requests)
+
+    def stop(self):
+        self._exhausted = True
+
+    def extend(self, items):
+        for item in items:
+            identity = self.identity(item)
+            if identity not in self._seen:
+                self._seen.add(identity)
+                self.items.append(item)
+
+    def add_offset_page(self, offset, items, filtered, total=None):
+        """
+        offset: offset the result was requested with
+        items: items of the result, filtered: the subset to list
+        total: total of the listing if the endpoint reports one
+
+        returns wants_more()
+        """
+        self.requests += 1
+        offset = int(offset)
+        overflow = None
+        for item in filtered:
+            if self.is_full():
+                overflow = item
+                break
+            identity = self.identity(item)
+            if identity not in self._seen:
+                self._seen.add(identity)
+                self.items.append(item)
+        if overflow is not None:
+            # the page filled up within this result, the next listing page starts at the first item that did not fit
+            self.offset = self._index_offset(offset, overflow, items)
+        else:
+            self.offset = offset + len(items)
+            if len(items) < REQUEST_LIMIT:
+                self._exhausted = True
+        if (self.offset <= offset) or ((total is not None) and (total <= self.offset)):
+            self._exhausted = True
+        return self.wants_more()
+
+    def add_cursor_page(self, cursor, filtered):
+        """
+        returns wants_more()
+        """
+        self.requests += 1
+        self.cursor = cursor
+        self.extend(filtered)
+        if not cursor:
+            self._exhausted = True
+        return self.wants_more()
+
+    def _index_offset(self, offset, item, items):
+        identity = self.identity(item)
+        for index, _item in enumerate(items):
+            if self.identity(_item) == identity:
+                return offset + index
+        return offset + len(items)
+
+
+class _PageResult(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PagePrefetcher(object):
+    """
+    requests the pages of an offset based listing ahead of the consumer
+
+    the first page is requested directly, its total decides which of the following offsets exist.
+    at most `workers` of those are requested ahead of the page being consumed, on as many threads,
+    and pages are yielded in offset order. when the consumer stops, the remaining offsets are never requested
+
+    fetch: fetch(offset) -> api result with Keys.TOTAL
+    """
+
+    def __init__(self, fetch, limit=REQUEST_LIMIT, max_requests=MAX_REQUESTS, workers=PREFETCH_WORKERS):
+        self.fetch = fetch
+        self.limit = limit
+        self.max_requests = max_requests
+        self.workers = workers
+
+    def pages(self, offset=0):
+        """
+        yields (offset, result)
+        """
+        offset = int(offset)
+        first = self.fetch(offset)
+        yield offset, first
+        total = first.get(Keys.TOTAL, 0) if isinstance(first, dict) else 0
+        offsets = [offset + (self.limit * index) for index in range(1, self.max_requests)
+                   if (offset + (self.limit * index)) < total]
+        if not offsets:
+            return
+
+        pending = Queue()
+        results = dict((_offset, _PageResult()) for _offset in offsets)
+        cancelled = threading.Event()
+
+        def worker():
+            while True:
+                _offset = pending.get()
+                if (_offset is None) or cancelled.is_set():
+                    return
+                result = results[_offset]
+                try:
+                    result.value = self.fetch(_offset)
+                except:
+                    result.error = sys.exc_info()
+                finally:
+                    result.done.set()
+
+        workers = min(self.workers, len(offsets))
+        for _offset in offsets[:workers]:
+            pending.put(_offset)
+        requested = workers
+        for _ in range(workers):
+            thread = threading.Thread(target=worker)
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for _offset in offsets:
+                result = results[_offset]
+                result.done.wait()
+                if result.error is not None:
+                    raise result.error[0], result.error[1], result.error[2]
+                yield _offset, result.value
+                # the consumer wants more, keep `workers` pages requested ahead of it
+                if requested < len(offsets):
+                    pending.put(offsets[requested])
+                    requested += 1
+        finally:
+            cancelled.set()
+            for _ in range(workers):
+                pending.put(None)
+            skipped = len(offsets) - requested
+            if skipped:
+                log_utils.log('Prefetch: skipped |%d| page requests' % skipped, log_utils.LOGDEBUG)
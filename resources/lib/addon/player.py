@@ -119,10 +119,8 @@ class TwitchPlayer(xbmc.Player):
                                     break
                                 retries += 1
                                 try:
-                                    try:
-                                        cache.reset_cache()
-                                    except:
-                                        pass
+                                    cache.invalidate(tag='get_live:%s' % name)
+                                    cache.invalidate(tag='get_channel_stream:%s' % channel_id)
                                     twitch = api.Twitch()
                                     videos = twitch.get_live(name)
                                     result = twitch.get_channel_stream(channel_id)[Keys.STREAM]
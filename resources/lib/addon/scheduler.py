@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+    Task scheduling for the service
+
+    Copyright (C) 2016 Twitch-on-Kodi
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import time
+from collections import deque
+from common.log_utils import monotonic
+
+POLL_INTERVAL = 300  # seconds between live polls at an average hour with average activity
+POLL_MIN_INTERVAL = 90
+POLL_MAX_INTERVAL = 1800
+
+# local hour -> poll interval factor, prime time is polled more often, the early morning less
+HOUR_FACTORS = (0.75, 0.75, 1.5, 2.0, 2.0, 2.0, 2.0, 2.0, 1.5, 1.5, 1.0, 1.0,
+                1.0, 1.0, 1.0, 1.0, 1.0, 0.75, 0.5, 0.5, 0.5, 0.5, 0.5, 0.75)
+
+ACTIVITY_WINDOW = 3600  # seconds of go-live history considered
+BUSY_GO_LIVES = 6
+ACTIVE_GO_LIVES = 2
+
+
+class Scheduler(object):
+    """
+    named tasks and the monotonic time they are due at
+    """
+
+    def __init__(self, clock=monotonic):
+        self.clock = clock
+        self._due = {}
+
+    def schedule(self, name, delay):
+        self._due[name] = self.clock() + max(delay, 0)
+
+    def is_due(self, name):
+        due = self._due.get(name)
+        return (due is None) or (due <= self.clock())
+
+    def wait_time(self, maximum=None):
+        """
+        seconds until the next task is due, 0 if one already is
+        """
+        now = self.clock()
+        waits = [max(due - now, 0) for due in self._due.itervalues()]
+        if maximum is not None:
+            waits.append(maximum)
+        return min(waits) if waits else 0
+
+
+class PollInterval(object):
+    """
+    interval between live polls, adapted to the hour of day and how often followed channels went live recently,
+    failed polls back off exponentially
+    """
+
+    def __init__(self, interval=POLL_INTERVAL, minimum=POLL_MIN_INTERVAL, maximum=POLL_MAX_INTERVAL, clock=monotonic):
+        self.interval = interval
+        self.minimum = minimum
+        self.maximum = maximum
+        self.clock = clock
+        self.failures = 0
+        self._go_lives = deque()  # (monotonic time, count)
+
+    def success(self, went_live=0):
+        self.failures = 0
+        if went_live:
+            self._go_lives.append((self.clock(), went_live))
+
+    def failure(self):
+        self.failures += 1
+
+    def recent_go_lives(self):
+        cutoff = self.clock() - ACTIVITY_WINDOW
+        while self._go_lives and self._go_lives[0][0] < cutoff:
+            self._go_lives.popleft()
+        return sum(count for _, count in self._go_lives)
+
+    def activity_factor(self):
+        go_lives = self.recent_go_lives()
+        if go_lives >= BUSY_GO_LIVES:
+            return 0.5
+        if go_lives >= ACTIVE_GO_LIVES:
+            return 0.75
+        if not go_lives:
+            return 1.25
+        return 1.0
+
+    def next(self):
+        """
+        returns seconds until the next poll
+        """
+        if self.failures:
+            return min(self.interval * (2 ** min(self.failures, 8)), self.maximum)
+        interval = self.interval * HOUR_FACTORS[time.localtime().tm_hour] * self.activity_factor()
+        return int(min(max(interval, self.minimum), self.maximum))
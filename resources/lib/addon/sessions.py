@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+    Shared HTTP session for Twitch API and usher requests
+
+    Copyright (C) 2016 Twitch-on-Kodi
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program. If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from common import log_utils
+
+POOL_CONNECTIONS = 4  # hosts kept in the pool, api.twitch.tv, usher.ttvnw.net, ...
+POOL_MAXSIZE = 8  # connections kept alive per host, covers concurrent page requests
+
+SESSION_METHODS = ('request', 'get', 'post', 'put', 'patch', 'delete', 'head', 'options')
+
+
+def _create_session():
+    _session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    _session.mount('https://', adapter)
+    _session.mount('http://', adapter)
+    return _session
+
+
+session = _create_session()
+
+
+class SessionRequests(object):
+    """
+    stands in for the requests module, module level request functions use the shared session
+    everything else (exceptions, codes, ...) comes from requests itself
+    """
+
+    def __init__(self, _session):
+        self._session = _session
+
+    def __getattr__(self, name):
+        if name in SESSION_METHODS:
+            return getattr(self._session, name)
+        return getattr(requests, name)
+
+
+def install():
+    """
+    route requests made by script.module.python.twitch through the shared session
+    """
+    try:
+        from twitch import scraper
+        if not isinstance(scraper.requests, SessionRequests):
+            scraper.requests = SessionRequests(session)
+        return True
+    except Exception as e:
+        log_utils.log('Failed to install shared HTTP session: %s' % (e), log_utils.LOGWARNING)
+        return False
+
+
+def get_stats():
+    """
+    returns {host: {connections, requests, reused}} for the hosts currently pooled
+    """
+    stats = {}
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            host = '%s://%s:%s' % (pool.scheme, pool.host, pool.port)
+            connections = getattr(pool, 'num_connections', 0)
+            total = getattr(pool, 'num_requests', 0)
+            stats[host] = {'connections': connections, 'requests': total, 'reused': max(total - connections, 0)}
+    return stats
+
+
+def log_stats(level=log_utils.LOGDEBUG):
+    for host, stats in sorted(get_stats().iteritems()):
+        log_utils.log('Connection stats |%s| connections |%d| requests |%d| reused |%d|' %
+                      (host, stats['connections'], stats['requests'], stats['reused']), level)
@@ -24,7 +24,7 @@ from base64 import b64decode
 from common import kodi, json_store
 from strings import STRINGS
 from tccleaner import TextureCacheCleaner
-from constants import CLIENT_ID, REDIRECT_URI, LIVE_PREVIEW_TEMPLATE, Images, ADDON_DATA_DIR, REQUEST_LIMIT, COLORS
+from constants import CLIENT_ID, REDIRECT_URI, LIVE_PREVIEW_TEMPLATE, Images, ADDON_DATA_DIR, COLORS, Keys
 from twitch.api.parameters import Boolean, Period, ClipPeriod, Direction, Language, SortBy, VideoSort
 import xbmcvfs
 
@@ -34,6 +34,8 @@ i18n = translations.i18n
 if not xbmcvfs.exists(ADDON_DATA_DIR):
     mkdir_result = xbmcvfs.mkdir(ADDON_DATA_DIR)
 storage = json_store.JSONStore(ADDON_DATA_DIR + 'storage.json')
+_colors = COLORS.decode('utf-8').split('|')
+_blacklist_index = None  # {list_type: frozenset}, see get_blacklist_index
 
 
 def show_menu(menu, parent=None):
@@ -98,7 +100,7 @@ def get_oauth_token(token_only=True, required=False):
 
 
 def get_items_per_page():
-    return int(kodi.get_setting('items_per_page'))
+    return kodi.settings.get_int('items_per_page')
 
 
 def calculate_pagination_values(index):
@@ -108,22 +110,8 @@ def calculate_pagination_values(index):
     return index, offset, limit
 
 
-def get_offset(offset, item, items, key=None):
-    if item is None:
-        return int(offset) + REQUEST_LIMIT
-    try:
-        if key is None:
-            return int(offset) + next(index for (index, _item) in enumerate(items) if item == _item)
-        else:
-            return int(offset) + next(index for (index, _item) in enumerate(items) if item == _item[key])
-    except:
-        return None
-
-
 def get_vodcast_color():
-    color = int(kodi.get_setting('vodcast_highlight'))
-    color = COLORS.split('|')[color]
-    return color.decode('utf-8')
+    return _colors[kodi.settings.get_int('vodcast_highlight')]
 
 
 def the_art(art=None):
@@ -284,7 +272,12 @@ _sorting_defaults = \
     }
 
 
-def get_stored_json():
+def get_stored_json(refresh=False):
+    """
+    refresh: pick up changes other processes made since the store was loaded
+    """
+    if refresh and storage.refresh():
+        invalidate_blacklist_index()
     json_data = storage.load()
     needs_save = False
     # set defaults
@@ -292,8 +285,14 @@ def get_stored_json():
         json_data['blacklist'] = {'user': [], 'game': [], 'community': []}
         needs_save = True
     if 'qualities' not in json_data:
-        json_data['qualities'] = {'stream': [], 'video': [], 'clip': []}
+        json_data['qualities'] = {'stream': {}, 'video': {}, 'clip': {}}
         needs_save = True
+    for content_type, qualities in json_data['qualities'].items():
+        if isinstance(qualities, list):
+            # migrate [{target_id: {name, quality}}, ...] to {target_id: {name, quality}}
+            json_data['qualities'][content_type] = dict((str(target_id), quality) for item in qualities
+                                                        for target_id, quality in item.iteritems())
+            needs_save = True
     if 'sorting' not in json_data:
         json_data['sorting'] = _sorting_defaults
         needs_save = True
@@ -305,18 +304,36 @@ def get_stored_json():
     return json_data
 
 
+def get_blacklist_index():
+    """
+    {list_type: frozenset} of blacklisted ids, games and communities also match on name
+    built once per process and dropped whenever a blacklist is written
+    """
+    global _blacklist_index
+    if _blacklist_index is None:
+        json_data = get_stored_json()
+        index = dict()
+        for list_type, blacklist in json_data['blacklist'].iteritems():
+            if list_type == 'user':
+                index[list_type] = frozenset(blacklist_id for blacklist_id, blacklist_name in blacklist)
+            else:
+                index[list_type] = frozenset(value for blacklist_item in blacklist for value in blacklist_item)
+        _blacklist_index = index
+    return _blacklist_index
+
+
+def invalidate_blacklist_index():
+    global _blacklist_index
+    _blacklist_index = None
+
+
 def is_blacklisted(target, list_type='user'):
-    json_data = get_stored_json()
-    blacklist = json_data['blacklist'].get(list_type)
+    blacklist = get_blacklist_index().get(list_type)
     if not blacklist:
         return False
     if isinstance(target, int):
         target = str(target)
-    if list_type == 'user':
-        return any(target == blacklist_id for blacklist_id, blacklist_name in blacklist)
-    else:
-        return any((target == blacklist_id or
-                    target == blacklist_name) for blacklist_id, blacklist_name in blacklist)
+    return target in blacklist
 
 
 def add_blacklist(target_id, name, list_type='user'):
@@ -328,6 +345,7 @@ def add_blacklist(target_id, name, list_type='user'):
             json_data['blacklist'][list_type] = []
         json_data['blacklist'][list_type].append([target_id, name])
         storage.save(json_data)
+        invalidate_blacklist_index()
         return True
     return False
 
@@ -341,6 +359,7 @@ def remove_blacklist(list_type='user'):
     else:
         result = json_data['blacklist'][list_type].pop(result)
         storage.save(json_data)
+        invalidate_blacklist_index()
         return result
 
 
@@ -402,37 +421,34 @@ def set_sort(for_type, sort_by, direction, period):
 
 def get_default_quality(content_type, target_id):
     json_data = get_stored_json()
-    if content_type not in json_data['qualities']:
-        json_data['qualities'][content_type] = []
-    if any(str(target_id) in item for item in json_data['qualities'][content_type]):
-        return next(item for item in json_data['qualities'][content_type] if str(target_id) in item)
-    else:
+    quality = json_data['qualities'].get(content_type, {}).get(str(target_id))
+    if quality is None:
         return None
+    return {target_id: quality}
 
 
 def add_default_quality(content_type, target_id, name, quality):
     json_data = get_stored_json()
-    current_quality = get_default_quality(content_type, target_id)
-    if current_quality:
-        current_quality = current_quality[target_id]['quality']
-        if current_quality.lower() == quality.lower():
-            return False
-        else:
-            index = next(index for index, item in enumerate(json_data['qualities'][content_type]) if str(target_id) in item)
-            del json_data['qualities'][content_type][index]
-    json_data['qualities'][content_type].append({target_id: {'name': name, 'quality': quality}})
+    qualities = json_data['qualities'].setdefault(content_type, {})
+    current_quality = qualities.get(str(target_id))
+    if current_quality and current_quality['quality'].lower() == quality.lower():
+        return False
+    qualities[str(target_id)] = {'name': name, 'quality': quality}
     storage.save(json_data)
     return True
 
 
 def remove_default_quality(content_type):
     json_data = get_stored_json()
+    qualities = json_data['qualities'].get(content_type, {})
+    target_ids = sorted(qualities.keys(), key=lambda target_id: qualities[target_id]['name'].lower())
     result = kodi.Dialog().select(i18n('remove_default_quality') % content_type,
-                                  ['%s [%s]' % (user[user.keys()[0]]['name'], user[user.keys()[0]]['quality']) for user in json_data['qualities'][content_type]])
+                                  ['%s [%s]' % (qualities[target_id]['name'], qualities[target_id]['quality']) for target_id in target_ids])
     if result == -1:
         return None
     else:
-        result = json_data['qualities'][content_type].pop(result)
+        target_id = target_ids[result]
+        result = {target_id: qualities.pop(target_id)}
         storage.save(json_data)
         return result
 
@@ -440,35 +456,64 @@ def remove_default_quality(content_type):
 def clear_list(list_type, list_name):
     json_data = get_stored_json()
     if (list_name in json_data) and (list_type in json_data[list_name]):
-        json_data[list_name][list_type] = []
+        json_data[list_name][list_type] = {} if list_name == 'qualities' else []
         storage.save(json_data)
+        if list_name == 'blacklist':
+            invalidate_blacklist_index()
         return True
     else:
         return False
 
 
-class BlacklistFilter(object):
-    def by_type(self, results, result_key, parent_keys=None,
-                id_key=None, game_key=None, list_type='user'):
-        if (id_key is None) and (game_key is None): return
-        # list_type = user, game, community
-        filtered_results = {result_key: list()}
-        for result in results[result_key]:
-            identification = None
-            id_parent = result
-            key = id_key if id_key else game_key
-            if parent_keys is None:
-                identification = id_parent[key]
+class FilterPipeline(object):
+    """
+    blacklist predicates applied to each result in a single pass, a result is dropped by the first predicate it fails
+
+    predicates are added by chaining, ie. FilterPipeline().user(parent_keys=[Keys.CHANNEL]).game()
+    the blacklists are read when filtering starts, so a pipeline can be kept for the lifetime of the process
+    """
+
+    def __init__(self):
+        self._predicates = list()
+
+    def user(self, parent_keys=None, id_key=Keys._ID):
+        self._predicates.append(('user', parent_keys, id_key))
+        return self
+
+    def game(self, parent_keys=None, game_key=Keys.GAME):
+        self._predicates.append(('game', parent_keys, game_key))
+        return self
+
+    def community(self, parent_keys=None, id_key=Keys._ID):
+        self._predicates.append(('community', parent_keys, id_key))
+        return self
+
+    def filter(self, items):
+        """
+        generator over the items passing every predicate, items are only checked as they are consumed
+        """
+        index = get_blacklist_index()
+        predicates = [(index.get(list_type, frozenset()), parent_keys, key) for list_type, parent_keys, key in self._predicates]
+        for item in items:
+            for blacklist, parent_keys, key in predicates:
+                identification = item
+                for parent_key in parent_keys or ():
+                    identification = identification[parent_key]
+                identification = identification[key]
+                if identification is None:
+                    break
+                if isinstance(identification, int):
+                    identification = str(identification)
+                if identification in blacklist:
+                    break
             else:
-                for parent_key in parent_keys:
-                    id_parent = id_parent[parent_key]
-                    identification = id_parent[key]
-            if game_key and identification:
-                identification = identification if identification else ''
-            if identification is not None:
-                if not is_blacklisted(identification, list_type=list_type):
-                    filtered_results[result_key].append(result)
-        return filtered_results
+                yield item
+
+    def apply(self, results, result_key):
+        """
+        returns {result_key: [item, ...]} with the items passing every predicate
+        """
+        return {result_key: list(self.filter(results[result_key]))}
 
 
 class TitleBuilder(object):
@@ -486,7 +531,7 @@ class TitleBuilder(object):
         self.line_length = line_length
 
     def format_title(self, title_values):
-        title_setting = int(kodi.get_setting('title_display'))
+        title_setting = kodi.settings.get_int('title_display')
         template = self.get_title_template(title_setting)
 
         for key, value in title_values.iteritems():
@@ -514,7 +559,7 @@ class TitleBuilder(object):
             return value
 
     def truncate_title(self, title):
-        truncate_setting = kodi.get_setting('title_truncate') == 'true'
+        truncate_setting = kodi.settings.get_bool('title_truncate')
 
         if truncate_setting:
             short_title = title[:self.line_length]
@@ -19,12 +19,13 @@
 
 import sys
 import traceback
-from addon import utils, api, menu_items, cache
+from addon import utils, api, menu_items, cache, sessions, pagination, live_status
 from addon.common import kodi, log_utils
 from addon.common.url_dispatcher import URL_Dispatcher
 from addon.converter import JsonListItemConverter
 from addon.constants import MODES, LINE_LENGTH, LIVE_PREVIEW_TEMPLATE, Keys, REQUEST_LIMIT, CURSOR_LIMIT, MAX_REQUESTS
 from addon.googl_shorten import googl_url
+from addon.pagination import PageAggregator, PagePrefetcher
 from addon.error_handling import error_handler
 from addon.twitch_exceptions import SubRequired, NotFound, PlaybackFailed, TwitchException
 from twitch.api.parameters import Boolean, Period, ClipPeriod, Direction, SortBy, VideoSort, Language, StreamType, Platform
@@ -32,7 +33,18 @@ from twitch.api.parameters import Boolean, Period, ClipPeriod, Direction, SortBy
 i18n = utils.i18n
 dispatcher = URL_Dispatcher()
 converter = JsonListItemConverter(LINE_LENGTH)
-blacklist_filter = utils.BlacklistFilter()
+featured_filter = utils.FilterPipeline().user(parent_keys=[Keys.STREAM, Keys.CHANNEL]).game(parent_keys=[Keys.STREAM])
+top_game_filter = utils.FilterPipeline().game(parent_keys=[Keys.GAME], game_key=Keys.NAME)
+followed_game_filter = utils.FilterPipeline().game(game_key=Keys._ID)
+community_filter = utils.FilterPipeline().community()
+channel_filter = utils.FilterPipeline().user()
+stream_filter = utils.FilterPipeline().user(parent_keys=[Keys.CHANNEL]).game()
+# filtering by game causes excessive calls (game-centric communities), game streams are of one game
+category_stream_filter = utils.FilterPipeline().user(parent_keys=[Keys.CHANNEL])
+video_filter = utils.FilterPipeline().user(parent_keys=[Keys.CHANNEL]).game()
+clip_filter = utils.FilterPipeline().user(parent_keys=[Keys.BROADCASTER], id_key=Keys.ID).game()
+collection_filter = utils.FilterPipeline().user(parent_keys=[Keys.OWNER])
+collection_item_filter = utils.FilterPipeline().user(parent_keys=[Keys.OWNER]).game()
 twitch = None
 
 
@@ -276,10 +288,7 @@ def list_featured_streams():
     kodi.set_view('videos', set_sort=True)
     streams = twitch.get_featured_streams(offset=0, limit=100)
     if Keys.FEATURED in streams:
-        filtered = \
-            blacklist_filter.by_type(streams, Keys.FEATURED, parent_keys=[Keys.STREAM, Keys.CHANNEL], id_key=Keys._ID, list_type='user')
-        filtered = \
-            blacklist_filter.by_type(filtered, Keys.FEATURED, parent_keys=[Keys.STREAM], game_key=Keys.GAME, list_type='game')
+        filtered = featured_filter.apply(streams, Keys.FEATURED)
         if filtered[Keys.FEATURED]:
             for result in filtered[Keys.FEATURED]:
                 kodi.create_item(converter.stream_to_listitem(result[Keys.STREAM]))
@@ -294,32 +303,19 @@ def list_all_games(offset=0):
     kodi.set_view('files', set_sort=False)
     per_page = utils.get_items_per_page()
     games = None
-    all_items = list()
-    requests = 0
-    while (per_page >= (len(all_items) + 1)) and (requests < MAX_REQUESTS):
-        requests += 1
-        games = twitch.get_top_games(offset, limit=REQUEST_LIMIT)
+    aggregator = PageAggregator(per_page, pagination.by_game_id, offset=offset)
+    prefetcher = PagePrefetcher(lambda _offset: twitch.get_top_games(_offset, limit=REQUEST_LIMIT))
+    for page_offset, games in prefetcher.pages(offset):
         if (games[Keys.TOTAL] > 0) and (Keys.TOP in games):
-            filtered = \
-                blacklist_filter.by_type(games, Keys.TOP, parent_keys=[Keys.GAME], game_key=Keys.NAME, list_type='game')
-            last = None
-            for game in filtered[Keys.TOP]:
-                last = game
-                if per_page >= (len(all_items) + 1):
-                    add_item = last if last not in all_items else None
-                    if add_item:
-                        all_items.append(add_item)
-                else:
-                    break
-            offset = utils.get_offset(offset, last[Keys.GAME], games[Keys.TOP], key=Keys.GAME)
-            if (offset is None) or (games[Keys.TOTAL] <= offset) or (games[Keys.TOTAL] <= REQUEST_LIMIT):
+            if not aggregator.add_offset_page(page_offset, games[Keys.TOP], top_game_filter.filter(games[Keys.TOP]), total=games[Keys.TOTAL]):
                 break
         else:
             break
+    offset = aggregator.offset
     has_items = False
-    if len(all_items) > 0:
+    if len(aggregator.items) > 0:
         has_items = True
-        for game in all_items:
+        for game in aggregator.items:
             kodi.create_item(converter.game_to_listitem(game))
     if games[Keys.TOTAL] > (offset + 1):
         has_items = True
@@ -334,25 +330,19 @@ def list_all_games(offset=0):
 @error_handler
 def list_all_communities(cursor='MA=='):
     kodi.set_view('files', set_sort=False)
-    all_items = list()
-    requests = 0
-    while (CURSOR_LIMIT >= (len(all_items) + 1)) and cursor and (requests < MAX_REQUESTS):
-        requests += 1
-        communities = twitch.get_top_communities(cursor, limit=CURSOR_LIMIT)
-        cursor = communities[Keys.CURSOR]
+    aggregator = PageAggregator(CURSOR_LIMIT, pagination.by_id, cursor=cursor)
+    while aggregator.wants_more():
+        communities = twitch.get_top_communities(aggregator.cursor, limit=CURSOR_LIMIT)
         if (communities[Keys.TOTAL] > 0) and (Keys.COMMUNITIES in communities):
-            filtered = \
-                blacklist_filter.by_type(communities, Keys.COMMUNITIES, id_key=Keys._ID, list_type='community')
-            for community in filtered[Keys.COMMUNITIES]:
-                add_item = community if community not in all_items else None
-                if add_item:
-                    all_items.append(add_item)
+            aggregator.add_cursor_page(communities[Keys.CURSOR], community_filter.filter(communities[Keys.COMMUNITIES]))
         else:
+            aggregator.add_cursor_page(communities[Keys.CURSOR], [])
             break
+    cursor = aggregator.cursor
     has_items = False
-    if len(all_items) > 0:
+    if len(aggregator.items) > 0:
         has_items = True
-        for community in all_items:
+        for community in aggregator.items:
             kodi.create_item(converter.community_to_listitem(community))
     if cursor:
         has_items = True
@@ -370,35 +360,21 @@ def list_streams(stream_type=StreamType.LIVE, offset=0, platform=Platform.ALL):
     kodi.set_view('videos', set_sort=True)
     per_page = utils.get_items_per_page()
     streams = None
-    all_items = list()
-    requests = 0
-    while (per_page >= (len(all_items) + 1)) and (requests < MAX_REQUESTS):
-        requests += 1
-        languages = ','.join(utils.get_languages())
-        streams = twitch.get_all_streams(stream_type=stream_type, platform=platform, offset=offset, limit=REQUEST_LIMIT, language=languages)
+    aggregator = PageAggregator(per_page, pagination.by_channel_id, offset=offset)
+    languages = ','.join(utils.get_languages())
+    prefetcher = PagePrefetcher(lambda _offset: twitch.get_all_streams(stream_type=stream_type, platform=platform, offset=_offset,
+                                                                       limit=REQUEST_LIMIT, language=languages))
+    for page_offset, streams in prefetcher.pages(offset):
         if (streams[Keys.TOTAL] > 0) and (Keys.STREAMS in streams):
-            filtered = \
-                blacklist_filter.by_type(streams, Keys.STREAMS, parent_keys=[Keys.CHANNEL], id_key=Keys._ID, list_type='user')
-            filtered = \
-                blacklist_filter.by_type(filtered, Keys.STREAMS, game_key=Keys.GAME, list_type='game')
-            last = None
-            for stream in filtered[Keys.STREAMS]:
-                last = stream
-                if per_page >= (len(all_items) + 1):
-                    add_item = last if last not in all_items else None
-                    if add_item:
-                        all_items.append(add_item)
-                else:
-                    break
-            offset = utils.get_offset(offset, last, streams[Keys.STREAMS])
-            if (offset is None) or (streams[Keys.TOTAL] <= offset) or (streams[Keys.TOTAL] <= REQUEST_LIMIT):
+            if not aggregator.add_offset_page(page_offset, streams[Keys.STREAMS], stream_filter.filter(streams[Keys.STREAMS]), total=streams[Keys.TOTAL]):
                 break
         else:
             break
+    offset = aggregator.offset
     has_items = False
-    if len(all_items) > 0:
+    if len(aggregator.items) > 0:
         has_items = True
-        for stream in all_items:
+        for stream in aggregator.items:
             kodi.create_item(converter.stream_to_listitem(stream))
     if streams[Keys.TOTAL] > (offset + 1):
         has_items = True
@@ -420,34 +396,23 @@ def list_followed(content, offset=0, cursor='MA=='):
             utils.refresh_previews()
         kodi.set_view('videos', set_sort=True)
         streams = None
-        all_items = list()
-        requests = 0
-        while (per_page >= (len(all_items) + 1)) and (requests < MAX_REQUESTS):
-            requests += 1
-            streams = twitch.get_followed_streams(stream_type=content, offset=offset, limit=REQUEST_LIMIT)
+        aggregator = PageAggregator(per_page, pagination.by_channel_id, offset=offset)
+        snapshot = live_status.get_fresh_snapshot(user_id) if content == StreamType.LIVE else None
+        if snapshot is not None:
+            pages = snapshot.pages(offset, REQUEST_LIMIT, MAX_REQUESTS)
+        else:
+            pages = PagePrefetcher(lambda _offset: twitch.get_followed_streams(stream_type=content, offset=_offset, limit=REQUEST_LIMIT)).pages(offset)
+        for page_offset, streams in pages:
             if (streams[Keys.TOTAL] > 0) and (Keys.STREAMS in streams):
-                filtered = \
-                    blacklist_filter.by_type(streams, Keys.STREAMS, parent_keys=[Keys.CHANNEL], id_key=Keys._ID, list_type='user')
-                filtered = \
-                    blacklist_filter.by_type(filtered, Keys.STREAMS, game_key=Keys.GAME, list_type='game')
-                last = None
-                for stream in filtered[Keys.STREAMS]:
-                    last = stream
-                    if per_page >= (len(all_items) + 1):
-                        add_item = last if last not in all_items else None
-                        if add_item:
-                            all_items.append(add_item)
-                    else:
-                        break
-                offset = utils.get_offset(offset, last, streams[Keys.STREAMS])
-                if (offset is None) or (streams[Keys.TOTAL] <= offset) or (streams[Keys.TOTAL] <= REQUEST_LIMIT):
+                if not aggregator.add_offset_page(page_offset, streams[Keys.STREAMS], stream_filter.filter(streams[Keys.STREAMS]), total=streams[Keys.TOTAL]):
                     break
             else:
                 break
+        offset = aggregator.offset
         has_items = False
-        if len(all_items) > 0:
+        if len(aggregator.items) > 0:
             has_items = True
-            for stream in all_items:
+            for stream in aggregator.items:
                 kodi.create_item(converter.stream_to_listitem(stream))
         if streams[Keys.TOTAL] > (offset + 1):
             has_items = True
@@ -463,33 +428,19 @@ def list_followed(content, offset=0, cursor='MA=='):
         kodi.set_view('files', set_sort=False)
         sorting = utils.get_sort('followed_channels')
         channels = None
-        all_items = list()
-        requests = 0
-        while (per_page >= (len(all_items) + 1)) and (requests < MAX_REQUESTS):
-            requests += 1
-            channels = twitch.get_followed_channels(user_id=user_id, offset=offset, limit=REQUEST_LIMIT, direction=sorting['direction'], sort_by=sorting['by'])
+        aggregator = PageAggregator(per_page, pagination.by_id, offset=offset)
+        while aggregator.wants_more():
+            channels = twitch.get_followed_channels(user_id=user_id, offset=aggregator.offset, limit=REQUEST_LIMIT, direction=sorting['direction'], sort_by=sorting['by'])
             if (channels[Keys.TOTAL] > 0) and (Keys.FOLLOWS in channels):
-                filtered = \
-                    blacklist_filter.by_type(channels, Keys.FOLLOWS, parent_keys=[Keys.CHANNEL], id_key=Keys._ID, list_type='user')
-                last = None
-                for follow in filtered[Keys.FOLLOWS]:
-                    channel = follow[Keys.CHANNEL]
-                    last = channel
-                    if per_page >= (len(all_items) + 1):
-                        add_item = last if last not in all_items else None
-                        if add_item:
-                            all_items.append(add_item)
-                    else:
-                        break
-                offset = utils.get_offset(offset, last, channels[Keys.FOLLOWS], key=Keys.CHANNEL)
-                if (offset is None) or (channels[Keys.TOTAL] <= offset) or (channels[Keys.TOTAL] <= REQUEST_LIMIT):
-                    break
+                followed_channels = [follow[Keys.CHANNEL] for follow in channels[Keys.FOLLOWS]]
+                aggregator.add_offset_page(aggregator.offset, followed_channels, channel_filter.filter(followed_channels), total=channels[Keys.TOTAL])
             else:
                 break
+        offset = aggregator.offset
         has_items = False
-        if len(all_items) > 0:
+        if len(aggregator.items) > 0:
             has_items = True
-            for channel in all_items:
+            for channel in aggregator.items:
                 kodi.create_item(converter.channel_to_listitem(channel))
         if channels[Keys.TOTAL] > (offset + 1):
             has_items = True
@@ -501,32 +452,18 @@ def list_followed(content, offset=0, cursor='MA=='):
     elif content == 'games':
         kodi.set_view('files', set_sort=False)
         games = None
-        all_items = list()
-        requests = 0
-        while (per_page >= (len(all_items) + 1)) and (requests < MAX_REQUESTS):
-            requests += 1
-            games = twitch.get_followed_games(username, offset, REQUEST_LIMIT)
+        aggregator = PageAggregator(per_page, pagination.by_id, offset=offset)
+        while aggregator.wants_more():
+            games = twitch.get_followed_games(username, aggregator.offset, REQUEST_LIMIT)
             if (games[Keys.TOTAL] > 0) and (Keys.FOLLOWS in games):
-                filtered = \
-                    blacklist_filter.by_type(games, Keys.FOLLOWS, game_key=Keys._ID, list_type='game')
-                last = None
-                for game in filtered[Keys.FOLLOWS]:
-                    last = game
-                    if per_page >= (len(all_items) + 1):
-                        add_item = last if last not in all_items else None
-                        if add_item:
-                            all_items.append(add_item)
-                    else:
-                        break
-                offset = utils.get_offset(offset, last, games[Keys.FOLLOWS])
-                if (offset is None) or (games[Keys.TOTAL] <= offset) or (games[Keys.TOTAL] <= REQUEST_LIMIT):
-                    break
+                aggregator.add_offset_page(aggregator.offset, games[Keys.FOLLOWS], followed_game_filter.filter(games[Keys.FOLLOWS]), total=games[Keys.TOTAL])
             else:
                 break
+        offset = aggregator.offset
         has_items = False
-        if len(all_items) > 0:
+        if len(aggregator.items) > 0:
             has_items = True
-            for game in all_items:
+            for game in aggregator.items:
                 kodi.create_item(converter.game_to_listitem(game))
         if games[Keys.TOTAL] > (offset + 1):
             has_items = True
@@ -538,28 +475,20 @@ def list_followed(content, offset=0, cursor='MA=='):
     elif content == 'clips':
         kodi.set_view('videos', set_sort=True)
         sort_by = utils.get_sort('clips', 'by')
-        all_items = list()
-        requests = 0
+        aggregator = PageAggregator(CURSOR_LIMIT, pagination.by_slug, cursor=cursor)
         languages = ','.join(utils.get_languages())
-        while (CURSOR_LIMIT >= (len(all_items) + 1)) and cursor and (requests < MAX_REQUESTS):
-            requests += 1
-            clips = twitch.get_followed_clips(cursor=cursor, limit=CURSOR_LIMIT, trending=sort_by, language=languages)
-            cursor = clips[Keys.CURSOR]
+        while aggregator.wants_more():
+            clips = twitch.get_followed_clips(cursor=aggregator.cursor, limit=CURSOR_LIMIT, trending=sort_by, language=languages)
             if Keys.CLIPS in clips and len(clips[Keys.CLIPS]) > 0:
-                filtered = \
-                    blacklist_filter.by_type(clips, Keys.CLIPS, parent_keys=[Keys.BROADCASTER], id_key=Keys.ID, list_type='user')
-                filtered = \
-                    blacklist_filter.by_type(filtered, Keys.CLIPS, game_key=Keys.GAME, list_type='game')
-                for clip in filtered[Keys.CLIPS]:
-                    add_item = clip if clip not in all_items else None
-                    if add_item:
-                        all_items.append(add_item)
+                aggregator.add_cursor_page(clips[Keys.CURSOR], clip_filter.filter(clips[Keys.CLIPS]))
             else:
+                aggregator.add_cursor_page(clips[Keys.CURSOR], [])
                 break
+        cursor = aggregator.cursor
         has_items = False
-        if len(all_items) > 0:
+        if len(aggregator.items) > 0:
             has_items = True
-            for clip in all_items:
+            for clip in aggregator.items:
                 kodi.create_item(converter.clip_to_listitem(clip))
         if cursor:
             has_items = True
@@ -607,26 +536,20 @@ def list_channel_video_types(channel_id=None, channel_name=None, display_name=No
 @error_handler
 def list_collections(channel_id, cursor='MA=='):
     kodi.set_view('files', set_sort=False)
-    all_items = list()
-    requests = 0
-    while (CURSOR_LIMIT >= (len(all_items) + 1)) and cursor and (requests < MAX_REQUESTS):
-        requests += 1
-        collections = twitch.get_collections(channel_id, cursor, limit=CURSOR_LIMIT)
-        cursor = collections[Keys.CURSOR]
+    aggregator = PageAggregator(CURSOR_LIMIT, pagination.by_id, cursor=cursor)
+    while aggregator.wants_more():
+        collections = twitch.get_collections(channel_id, aggregator.cursor, limit=CURSOR_LIMIT)
         if (Keys.COLLECTIONS in collections) and (len(collections[Keys.COLLECTIONS]) > 0):
-            filtered = \
-                blacklist_filter.by_type(collections, Keys.COLLECTIONS, parent_keys=[Keys.OWNER], id_key=Keys._ID, list_type='user')
-            for collection in filtered[Keys.COLLECTIONS]:
-                if collection[Keys.ITEMS_COUNT] > 0:
-                    add_item = collection if collection not in all_items else None
-                    if add_item:
-                        all_items.append(add_item)
+            aggregator.add_cursor_page(collections[Keys.CURSOR],
+                                       (collection for collection in collection_filter.filter(collections[Keys.COLLECTIONS]) if collection[Keys.ITEMS_COUNT] > 0))
         else:
+            aggregator.add_cursor_page(collections[Keys.CURSOR], [])
             break
+    cursor = aggregator.cursor
     has_items = False
-    if len(all_items) > 0:
+    if len(aggregator.items) > 0:
         has_items = True
-        for collection in all_items:
+        for collection in aggregator.items:
             kodi.create_item(converter.collection_to_listitem(collection))
     if cursor:
         has_items = True
@@ -642,18 +565,11 @@ def list_collections(channel_id, cursor='MA=='):
 def list_collection_videos(collection_id):
     kodi.set_view('videos', set_sort=True)
     videos = twitch.get_collection_videos(collection_id)
-    all_items = list()
+    aggregator = PageAggregator(None, pagination.by_id)
     if (Keys.ITEMS in videos) and (len(videos[Keys.ITEMS]) > 0):
-        filtered = \
-            blacklist_filter.by_type(videos, Keys.ITEMS, parent_keys=[Keys.OWNER], id_key=Keys._ID, list_type='user')
-        filtered = \
-            blacklist_filter.by_type(filtered, Keys.ITEMS, game_key=Keys.GAME, list_type='game')
-        for video in filtered[Keys.ITEMS]:
-            add_item = video if video not in all_items else None
-            if add_item:
-                all_items.append(add_item)
-        if len(all_items) > 0:
-            for video in all_items:
+        aggregator.extend(collection_item_filter.filter(videos[Keys.ITEMS]))
+        if len(aggregator.items) > 0:
+            for video in aggregator.items:
                 kodi.create_item(converter.collection_video_to_listitem(video))
             kodi.end_of_directory()
             return
@@ -665,28 +581,20 @@ def list_collection_videos(collection_id):
 def list_clips(cursor='MA==', channel_name=None, game=None):
     kodi.set_view('videos', set_sort=True)
     sorting = utils.get_sort('clips')
-    all_items = list()
-    requests = 0
+    aggregator = PageAggregator(CURSOR_LIMIT, pagination.by_slug, cursor=cursor)
     languages = ','.join(utils.get_languages())
-    while (CURSOR_LIMIT >= (len(all_items) + 1)) and cursor and (requests < MAX_REQUESTS):
-        requests += 1
-        clips = twitch.get_top_clips(cursor, limit=CURSOR_LIMIT, channel=channel_name, game=game, period=sorting['period'], trending=sorting['by'], language=languages)
-        cursor = clips[Keys.CURSOR]
+    while aggregator.wants_more():
+        clips = twitch.get_top_clips(aggregator.cursor, limit=CURSOR_LIMIT, channel=channel_name, game=game, period=sorting['period'], trending=sorting['by'], language=languages)
         if Keys.CLIPS in clips and len(clips[Keys.CLIPS]) > 0:
-            filtered = \
-                blacklist_filter.by_type(clips, Keys.CLIPS, parent_keys=[Keys.BROADCASTER], id_key=Keys.ID, list_type='user')
-            filtered = \
-                blacklist_filter.by_type(filtered, Keys.CLIPS, game_key=Keys.GAME, list_type='game')
-            for clip in filtered[Keys.CLIPS]:
-                add_item = clip if clip not in all_items else None
-                if add_item:
-                    all_items.append(add_item)
+            aggregator.add_cursor_page(clips[Keys.CURSOR], clip_filter.filter(clips[Keys.CLIPS]))
         else:
+            aggregator.add_cursor_page(clips[Keys.CURSOR], [])
             break
+    cursor = aggregator.cursor
     has_items = False
-    if len(all_items) > 0:
+    if len(aggregator.items) > 0:
         has_items = True
-        for clip in all_items:
+        for clip in aggregator.items:
             kodi.create_item(converter.clip_to_listitem(clip))
     if cursor:
         has_items = True
@@ -707,45 +615,29 @@ def list_channel_videos(broadcast_type, channel_id=None, game=None, offset=0):
     kodi.set_view('videos', set_sort=True)
     per_page = utils.get_items_per_page()
     videos = None
-    all_items = list()
-    requests = 0
-    while (per_page >= (len(all_items) + 1)) and (requests < MAX_REQUESTS):
-        requests += 1
+    aggregator = PageAggregator(per_page, pagination.by_id, offset=offset)
+    while aggregator.wants_more():
         if game is not None:
             period = utils.get_sort('top_videos', 'period')
-            videos = twitch.get_top_videos(offset, limit=REQUEST_LIMIT, game=game, broadcast_type=broadcast_type, period=period)
+            videos = twitch.get_top_videos(aggregator.offset, limit=REQUEST_LIMIT, game=game, broadcast_type=broadcast_type, period=period)
         else:
             if channel_id == 'all':
                 period = utils.get_sort('top_videos', 'period')
-                videos = twitch.get_top_videos(offset, limit=REQUEST_LIMIT, broadcast_type=broadcast_type, period=period)
+                videos = twitch.get_top_videos(aggregator.offset, limit=REQUEST_LIMIT, broadcast_type=broadcast_type, period=period)
             else:
                 sort_by = utils.get_sort('channel_videos', 'by')
                 languages = ','.join(utils.get_languages())
-                videos = twitch.get_channel_videos(channel_id, offset, limit=REQUEST_LIMIT, broadcast_type=broadcast_type, sort_by=sort_by, language=languages)
+                videos = twitch.get_channel_videos(channel_id, aggregator.offset, limit=REQUEST_LIMIT, broadcast_type=broadcast_type, sort_by=sort_by, language=languages)
         if Keys.VODS in videos or ((videos[Keys.TOTAL] > 0) and (Keys.VIDEOS in videos)):
             key = Keys.VODS if Keys.VODS in videos else Keys.VIDEOS
-            filtered = \
-                blacklist_filter.by_type(videos, key, parent_keys=[Keys.CHANNEL], id_key=Keys._ID, list_type='user')
-            filtered = \
-                blacklist_filter.by_type(filtered, key, game_key=Keys.GAME, list_type='game')
-            last = None
-            for video in filtered[key]:
-                last = video
-                if per_page >= (len(all_items) + 1):
-                    add_item = last if last not in all_items else None
-                    if add_item:
-                        all_items.append(add_item)
-                else:
-                    break
-            offset = utils.get_offset(offset, last, videos[key])
-            if (offset is None) or ((key == Keys.VIDEOS) and ((videos[Keys.TOTAL] <= offset) or (videos[Keys.TOTAL] <= REQUEST_LIMIT))):
-                break
+            aggregator.add_offset_page(aggregator.offset, videos[key], video_filter.filter(videos[key]), total=videos[Keys.TOTAL] if key == Keys.VIDEOS else None)
         else:
             break
+    offset = aggregator.offset
     has_items = False
-    if len(all_items) > 0 and videos is not None:
+    if len(aggregator.items) > 0 and videos is not None:
         has_items = True
-        for video in all_items:
+        for video in aggregator.items:
             kodi.create_item(converter.video_list_to_listitem(video))
     if Keys.VODS in videos or videos[Keys.TOTAL] > (offset + 1):
         has_items = True
@@ -776,33 +668,20 @@ def list_game_streams(game, offset=0):
     kodi.set_view('videos', set_sort=True)
     per_page = utils.get_items_per_page()
     streams = None
-    all_items = list()
-    requests = 0
-    while (per_page >= (len(all_items) + 1)) and (requests < MAX_REQUESTS):
-        requests += 1
-        languages = ','.join(utils.get_languages())
-        streams = twitch.get_game_streams(game=game, offset=offset, limit=REQUEST_LIMIT, language=languages)
+    aggregator = PageAggregator(per_page, pagination.by_channel_id, offset=offset)
+    languages = ','.join(utils.get_languages())
+    prefetcher = PagePrefetcher(lambda _offset: twitch.get_game_streams(game=game, offset=_offset, limit=REQUEST_LIMIT, language=languages))
+    for page_offset, streams in prefetcher.pages(offset):
         if (streams[Keys.TOTAL] > 0) and (Keys.STREAMS in streams):
-            filtered = \
-                blacklist_filter.by_type(streams, Keys.STREAMS, parent_keys=[Keys.CHANNEL], id_key=Keys._ID, list_type='user')
-            last = None
-            for stream in filtered[Keys.STREAMS]:
-                last = stream
-                if per_page >= (len(all_items) + 1):
-                    add_item = last if last not in all_items else None
-                    if add_item:
-                        all_items.append(add_item)
-                else:
-                    break
-            offset = utils.get_offset(offset, last, streams[Keys.STREAMS])
-            if (offset is None) or (streams[Keys.TOTAL] <= offset) or (streams[Keys.TOTAL] <= REQUEST_LIMIT):
+            if not aggregator.add_offset_page(page_offset, streams[Keys.STREAMS], category_stream_filter.filter(streams[Keys.STREAMS]), total=streams[Keys.TOTAL]):
                 break
         else:
             break
+    offset = aggregator.offset
     has_items = False
-    if len(all_items) > 0:
+    if len(aggregator.items) > 0:
         has_items = True
-        for stream in all_items:
+        for stream in aggregator.items:
             kodi.create_item(converter.stream_to_listitem(stream))
     if streams[Keys.TOTAL] > (offset + 1):
         has_items = True
@@ -820,36 +699,19 @@ def list_community_streams(community_id, offset=0):
     kodi.set_view('videos', set_sort=True)
     per_page = utils.get_items_per_page()
     streams = None
-    all_items = list()
-    requests = 0
-    while (per_page >= (len(all_items) + 1)) and (requests < MAX_REQUESTS):
-        requests += 1
+    aggregator = PageAggregator(per_page, pagination.by_channel_id, offset=offset)
+    while aggregator.wants_more():
         languages = ','.join(utils.get_languages())
-        streams = twitch.get_community_streams(community_id=community_id, offset=offset, limit=REQUEST_LIMIT, language=languages)
+        streams = twitch.get_community_streams(community_id=community_id, offset=aggregator.offset, limit=REQUEST_LIMIT, language=languages)
         if (streams[Keys.TOTAL] > 0) and (Keys.STREAMS in streams):
-            filtered = \
-                blacklist_filter.by_type(streams, Keys.STREAMS, parent_keys=[Keys.CHANNEL], id_key=Keys._ID, list_type='user')
-            # filtering by game causes excessive calls (game-centric communities)
-            # filtered, _filtered_total, __discarded = \
-            #     blacklist_filter.by_type(filtered, Keys.STREAMS, game_key=Keys.GAME, list_type='game')
-            last = None
-            for stream in filtered[Keys.STREAMS]:
-                last = stream
-                if per_page >= (len(all_items) + 1):
-                    add_item = last if last not in all_items else None
-                    if add_item:
-                        all_items.append(add_item)
-                else:
-                    break
-            offset = utils.get_offset(offset, last, streams[Keys.STREAMS])
-            if (offset is None) or (streams[Keys.TOTAL] <= offset) or (streams[Keys.TOTAL] <= REQUEST_LIMIT):
-                break
+            aggregator.add_offset_page(aggregator.offset, streams[Keys.STREAMS], category_stream_filter.filter(streams[Keys.STREAMS]), total=streams[Keys.TOTAL])
         else:
             break
+    offset = aggregator.offset
     has_items = False
-    if len(all_items) > 0:
+    if len(aggregator.items) > 0:
         has_items = True
-        for stream in all_items:
+        for stream in aggregator.items:
             kodi.create_item(converter.stream_to_listitem(stream))
         if streams[Keys.TOTAL] > (offset + 1):
             has_items = True
@@ -1230,7 +1092,13 @@ def run(argv=None):
         return
 
     mode = queries.get('mode', None)
-    dispatcher.dispatch(mode, queries)
+    log_utils.start_spans('route:%s' % mode)
+    try:
+        dispatcher.dispatch(mode, queries)
+    finally:
+        log_utils.finish_spans()
+    cache.log_stats()
+    sessions.log_stats()
 
 
 if __name__ == '__main__':
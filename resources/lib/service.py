@@ -17,24 +17,21 @@
     along with this program. If not, see <http://www.gnu.org/licenses/>.
 """
 
-from ast import literal_eval
-from datetime import datetime
+import time
 from itertools import izip_longest
-from urllib2 import quote, unquote
 from addon.common import kodi, log_utils
-from addon.constants import Keys
-from addon.utils import BlacklistFilter, i18n, get_stamp_diff, get_vodcast_color
+from addon.constants import Keys, REQUEST_LIMIT, SERVICE_MAX_REQUESTS, SERVICE_PREFETCH_WORKERS
+from addon.utils import FilterPipeline, i18n, get_vodcast_color, get_stored_json
 from addon.player import TwitchPlayer
-from addon import api, cache
-import xbmc
+from addon.live_status import LiveChannels
+from addon.pagination import PagePrefetcher
+from addon.scheduler import Scheduler, PollInterval, POLL_INTERVAL
+from addon import api, cache, sessions, live_status
 
-try:
-    cache.reset_cache()
-except:
-    pass
+cache.purge_expired()
 
-blacklist_filter = BlacklistFilter()
-monitor = xbmc.Monitor()
+stream_filter = FilterPipeline().user(parent_keys=[Keys.CHANNEL]).game()
+monitor = kodi.SettingsMonitor()
 window = kodi.Window(10000)
 
 
@@ -51,31 +48,39 @@ def notify_live():
     return notify, audible
 
 
+def prefetch_count():
+    if kodi.settings.get_bool('live_prefetch'):
+        return kodi.settings.get_int('live_prefetch_count', 3)
+    return 0
+
+
 def get_followed_streams(twitch_api):
-    streams = {Keys.TOTAL: 0}
-    offset = 0
-    all_followed = {Keys.STREAMS: []}
-    while streams[Keys.TOTAL] > (offset - 100):
-        if offset > 0:
-            if monitor.waitForAbort(1):
+    """
+    returns the live followed streams, None if abort was requested, False if a request failed
+    """
+    def fetch(offset):
+        # requested from the api every poll, notifications and the live snapshot need current results
+        return twitch_api.get_followed_streams(stream_type='live', offset=offset, limit=REQUEST_LIMIT, use_cached=False)
+
+    all_followed = []
+    pages = PagePrefetcher(fetch, limit=REQUEST_LIMIT, max_requests=SERVICE_MAX_REQUESTS, workers=SERVICE_PREFETCH_WORKERS).pages()
+    try:
+        for offset, streams in pages:
+            if monitor.abortRequested():
                 return None
-        try:
-            streams = twitch_api.get_followed_streams(stream_type='live', offset=offset, limit=100)
-        except:
-            break
-        if (streams[Keys.TOTAL] > 0) and (Keys.STREAMS in streams):
-            for stream in streams[Keys.STREAMS]:
-                all_followed[Keys.STREAMS].append(stream)
-            if streams[Keys.TOTAL] <= (offset + 100):
-                break
-            else:
-                offset += 100
-    filtered = \
-        blacklist_filter.by_type(all_followed, Keys.STREAMS, parent_keys=[Keys.CHANNEL], id_key=Keys._ID, list_type='user')
-    filtered = \
-        blacklist_filter.by_type(filtered, Keys.STREAMS, game_key=Keys.GAME, list_type='game')
+            all_followed.extend(streams.get(Keys.STREAMS) or [])
+    except:
+        log_utils.log('Service: Failed to get followed streams', log_utils.LOGERROR)
+        return False  # incomplete, keep the previous live channels
+    finally:
+        pages.close()
+    return all_followed
+
+
+def filter_streams(streams):
+    get_stored_json(refresh=True)  # apply blacklists the plugin saved since the last poll
     colorized = []
-    for stream in filtered[Keys.STREAMS]:
+    for stream in stream_filter.filter(streams):
         if stream.get(Keys.STREAM_TYPE) == 'watch_party':
             color = get_vodcast_color()
             if stream[Keys.CHANNEL].get(Keys.DISPLAY_NAME):
@@ -83,83 +88,157 @@ def get_followed_streams(twitch_api):
             if stream[Keys.CHANNEL].get(Keys.NAME):
                 stream[Keys.CHANNEL][Keys.NAME] = u'[COLOR={color}]{name}[/COLOR]'.format(name=stream[Keys.CHANNEL][Keys.NAME], color=color)
         colorized.append(stream)
-    followed_tuples = [(stream[Keys.CHANNEL][Keys._ID], stream[Keys.CHANNEL][Keys.NAME], stream[Keys.CHANNEL][Keys.DISPLAY_NAME]) for stream in colorized]
-    return followed_tuples
+    return colorized
 
 
-def set_online_followed(value):
-    window.setProperty(key='%s-online_followers' % kodi.get_id(), value=quote(str(value)))
+def set_online_followed(live_channels):
+    window.setProperty(key='%s-online_followers' % kodi.get_id(), value=live_channels.dumps())
 
 
 def get_online_followed():
-    result = unquote(window.getProperty(key='%s-online_followers' % kodi.get_id()))
-    if result:
-        return literal_eval(result)
-    else:
-        return result
+    return LiveChannels.loads(window.getProperty(key='%s-online_followers' % kodi.get_id()))
+
+
+def notify_names(heading, names, audible):
+    """
+    returns False if abort was requested while notifying
+    """
+    for followed_names in grouped(names):
+        message = ', '.join(followed_names)
+        message = message.rstrip(', ').rstrip(', ')
+        kodi.notify(heading, message, duration=notification_duration, sound=audible)
+        if monitor.waitForAbort(notification_sleep):
+            return False
+    return True
+
+
+def poll_live():
+    """
+    notifies about followed channels that went live, live channels are also tracked for prefetching
+
+    returns seconds until the next poll, None if abort was requested
+    """
+    do_notification, make_audible = notify_live()
+    if not do_notification and not prefetch_count():
+        return POLL_INTERVAL
+    if player.isPlayingVideo():
+        return playing_delay  # don't poll during playback, notifications are caught up afterwards
+    try:
+        twitch = api.Twitch()
+    except:
+        twitch = None
+    if not twitch:
+        poll_interval.failure()
+        return poll_interval.next()
+    if not twitch.access_token:
+        return POLL_INTERVAL
+
+    fetched = time.time()
+    current_live = get_followed_streams(twitch)
+    if current_live is None: return None  # if aborted during api requests
+    if current_live is False:
+        poll_interval.failure()
+        delay = poll_interval.next()
+        log_utils.log('Service: Live poll failed |%d| times, next poll in |%d|s' % (poll_interval.failures, delay), log_utils.LOGDEBUG)
+        return delay
+
+    live_channels = LiveChannels.from_streams(filter_streams(current_live))
+    online_channels = get_online_followed()
+    went_live, went_offline = live_channels.diff(online_channels)
+    poll_interval.success(len(went_live) if online_channels is not None else 0)
+    delay = poll_interval.next()
+    try:
+        live_status.publish_snapshot(twitch.get_user_id(), current_live, fetched, delay)
+    except:
+        log_utils.log('Service: Failed to publish live snapshot', log_utils.LOGERROR)
+    if went_live or went_offline or (online_channels is None):
+        set_online_followed(live_channels)
+    if went_offline:
+        log_utils.log('Service: Went offline |%s|' % ', '.join(online_channels.display_names(went_offline)), log_utils.LOGDEBUG)
+    if went_live and do_notification:
+        heading = i18n('currently_live') if online_channels is None else i18n('went_live')
+        names = live_channels.display_names(went_live)
+        log_utils.log('Service: Went live |%s|' % ', '.join(names), log_utils.LOGDEBUG)
+        if not notify_names(heading, names, make_audible):
+            return None
+    log_utils.log('Service: Next live poll in |%d|s' % delay, log_utils.LOGDEBUG)
+    return delay
+
+
+def rank_channels(live_channels, count):
+    """
+    channels with a saved default stream quality first, then in listing order
+    """
+    preferred = get_stored_json(refresh=True)['qualities'].get('stream', {})
+    return sorted(live_channels.ids, key=lambda channel_id: channel_id not in preferred)[:count]
+
+
+def prefetch_manifests():
+    """
+    resolves stream and usher manifest of the likeliest played live channels from the api, play() finds them cached
+    """
+    count = prefetch_count()
+    if (not count) or (cache.limit <= 0) or player.isPlayingVideo():
+        return
+    live_channels = get_online_followed()
+    if not live_channels:
+        return
+    try:
+        twitch = api.Twitch()
+    except:
+        return
+    if not twitch.access_token:
+        return
+    for channel_id in rank_channels(live_channels, count):
+        if monitor.abortRequested():
+            return
+        try:
+            stream = twitch.get_channel_stream(channel_id, use_cached=False)[Keys.STREAM]
+            if stream:
+                twitch.get_live(stream[Keys.CHANNEL][Keys.NAME], use_cached=False)
+        except:
+            log_utils.log('Service: Failed to prefetch live stream |%s|' % channel_id, log_utils.LOGDEBUG)
 
 
 # ---------------------------------------------------------------------------------------
 
 
-sleep_time = 1
-delay_time = 300
+min_sleep_time = 1
+playing_delay = 60
+refresh_delay = 10
+janitor_delay = 900
+prefetch_delay = max(int(cache.limit * 60 * 60), 60)  # prefetched manifests are renewed as they expire
 notification_duration = 4500
 notification_sleep = (float(notification_duration) / 1000.0) - 0.5  # shift by half second to avoid multiple audible notification
-timestamp = None
-abort = False
 
 log_utils.log('Service: Start', log_utils.LOGNOTICE)
 
 player = TwitchPlayer()
+scheduler = Scheduler()
+poll_interval = PollInterval()
 
 while not monitor.abortRequested():
-    time_diff = get_stamp_diff(timestamp)
-    if (timestamp is None) or (time_diff >= delay_time):
-        timestamp = str(datetime.now())
-        do_notification, make_audible = notify_live()
-        if do_notification:
+    if scheduler.is_due('live'):
+        live_delay = poll_live()
+        if live_delay is None: break
+        scheduler.schedule('live', live_delay)
+    if scheduler.is_due('prefetch'):
+        scheduler.schedule('prefetch', prefetch_delay)
+        prefetch_manifests()
+    if scheduler.is_due('refresh'):
+        scheduler.schedule('refresh', refresh_delay)
+        if cache.has_pending_refresh():
             try:
-                twitch = api.Twitch()
+                refreshed = cache.revalidate(api.Twitch())
+                log_utils.log('Service: Refreshed |%d| stale cache entries' % refreshed, log_utils.LOGDEBUG)
             except:
-                twitch = None
-            if twitch:
-                has_token = True if twitch.access_token else False
-                if has_token and do_notification:
-                    current_live = get_followed_streams(twitch)
-                    if current_live is None: break  # if aborted during api requests
-                    if current_live:
-                        current_online = get_online_followed()
-                        if not current_online:
-                            log_utils.log('Service: Now online |%s|' % current_live, log_utils.LOGDEBUG)
-                            set_online_followed(value=current_live)
-                            names = [display_name for _id, name, display_name in current_live]
-                            triplets = grouped(names)
-                            for followed_names in triplets:
-                                message = ', '.join(followed_names)
-                                message = message.rstrip(', ').rstrip(', ')
-                                kodi.notify(i18n('currently_live'), message, duration=notification_duration, sound=make_audible)
-                                if monitor.waitForAbort(notification_sleep):
-                                    abort = True
-                                    break
-                        else:
-                            log_utils.log('Service: Was online |%s|' % current_online, log_utils.LOGDEBUG)
-                            current_online = [match for match in current_online if match in current_live]
-                            new_online = [match for match in current_live if match not in current_online]
-                            log_utils.log('Service: New online |%s|' % new_online, log_utils.LOGDEBUG)
-                            current_online += new_online
-                            log_utils.log('Service: Now online |%s|' % current_online, log_utils.LOGDEBUG)
-                            set_online_followed(current_online)
-                            names = [display_name if display_name else name for _id, name, display_name in new_online]
-                            triplets = grouped(names)
-                            for followed_names in triplets:
-                                message = ', '.join(followed_names)
-                                message = message.rstrip(', ').rstrip(', ')
-                                kodi.notify(i18n('went_live'), message, duration=notification_duration, sound=make_audible)
-                                if monitor.waitForAbort(notification_sleep):
-                                    abort = True
-                                    break
-    if monitor.waitForAbort(sleep_time) or abort:
+                log_utils.log('Service: Failed to refresh stale cache entries', log_utils.LOGERROR)
+    if scheduler.is_due('janitor'):
+        scheduler.schedule('janitor', janitor_delay)
+        reclaimed = cache.trim(kodi.settings.get_int('cache_max_size', 50) * 1024 * 1024)  # setting is in MB
+        log_utils.log('Service: Cache janitor reclaimed |%d| bytes' % reclaimed, log_utils.LOGDEBUG)
+        sessions.log_stats()
+    if monitor.waitForAbort(max(scheduler.wait_time(), min_sleep_time)):
         break
 
 log_utils.log('Service: Shutdown', log_utils.LOGNOTICE)